@@ -0,0 +1,43 @@
+"""add column mapping cache
+
+Revision ID: 4f1c2a9d7e35
+Revises: ecfcd81b0436
+Create Date: 2026-10-17 11:02:47.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f1c2a9d7e35'
+down_revision: Union[str, None] = 'ecfcd81b0436'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'column_mapping_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('signature', sa.String(length=64), nullable=False),
+        sa.Column('schema_version', sa.String(length=64), nullable=False),
+        sa.Column('mapping', sa.JSON(), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_column_mapping_cache_id'), 'column_mapping_cache', ['id'], unique=False)
+    op.create_index('uix_mapping_cache_key', 'column_mapping_cache', ['kind', 'signature', 'schema_version'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uix_mapping_cache_key', table_name='column_mapping_cache')
+    op.drop_index(op.f('ix_column_mapping_cache_id'), table_name='column_mapping_cache')
+    op.drop_table('column_mapping_cache')
@@ -0,0 +1,38 @@
+"""add upload log content hash
+
+Revision ID: 9b3e6d41c0a2
+Revises: 4f1c2a9d7e35
+Create Date: 2026-10-17 13:24:09.551870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3e6d41c0a2'
+down_revision: Union[str, None] = '4f1c2a9d7e35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('upload_logs', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('upload_logs', sa.Column('job_id', sa.Integer(), nullable=True))
+    op.add_column('upload_logs', sa.Column('result', sa.JSON(), nullable=True))
+    op.create_foreign_key(
+        'upload_logs_job_id_fkey', 'upload_logs', 'ingestion_jobs', ['job_id'], ['id'], ondelete='SET NULL'
+    )
+    op.create_index('idx_uploadlog_supplier_hash', 'upload_logs', ['supplier_id', 'content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_uploadlog_supplier_hash', table_name='upload_logs')
+    op.drop_constraint('upload_logs_job_id_fkey', 'upload_logs', type_='foreignkey')
+    op.drop_column('upload_logs', 'result')
+    op.drop_column('upload_logs', 'job_id')
+    op.drop_column('upload_logs', 'content_hash')
@@ -0,0 +1,28 @@
+"""add ingestion job queue position
+
+Revision ID: a7e4c1d9b352
+Revises: f3d9b5a8e217
+Create Date: 2026-10-17 19:41:07.312845
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e4c1d9b352'
+down_revision: Union[str, None] = 'f3d9b5a8e217'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ingestion_jobs', sa.Column('queue_position', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ingestion_jobs', 'queue_position')
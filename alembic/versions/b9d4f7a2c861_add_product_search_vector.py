@@ -0,0 +1,40 @@
+"""add product search vector
+
+Revision ID: b9d4f7a2c861
+Revises: c5b8e2f4a613
+Create Date: 2026-10-17 22:03:18.274519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d4f7a2c861'
+down_revision: Union[str, None] = 'c5b8e2f4a613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english'::regconfig, coalesce(product_name, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(keywords, '')), 'B') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Adding a stored generated column rewrites the products table
+    op.add_column('products', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                        sa.Computed(SEARCH_VECTOR_SQL, persisted=True)))
+    op.create_index('ix_products_search_vector', 'products', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_search_vector', table_name='products', postgresql_using='gin')
+    op.drop_column('products', 'search_vector')
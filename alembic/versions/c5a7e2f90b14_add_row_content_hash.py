@@ -0,0 +1,30 @@
+"""add row content hash
+
+Revision ID: c5a7e2f90b14
+Revises: 9b3e6d41c0a2
+Create Date: 2026-10-17 14:08:31.204417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a7e2f90b14'
+down_revision: Union[str, None] = '9b3e6d41c0a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('content_hash', sa.BigInteger(), nullable=True))
+    op.add_column('product_images', sa.Column('content_hash', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('product_images', 'content_hash')
+    op.drop_column('products', 'content_hash')
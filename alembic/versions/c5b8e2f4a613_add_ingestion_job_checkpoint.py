@@ -0,0 +1,28 @@
+"""add ingestion job checkpoint
+
+Revision ID: c5b8e2f4a613
+Revises: a7e4c1d9b352
+Create Date: 2026-10-17 21:12:54.508316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5b8e2f4a613'
+down_revision: Union[str, None] = 'a7e4c1d9b352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ingestion_jobs', sa.Column('checkpoint', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ingestion_jobs', 'checkpoint')
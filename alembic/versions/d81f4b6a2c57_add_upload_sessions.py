@@ -0,0 +1,46 @@
+"""add upload sessions
+
+Revision ID: d81f4b6a2c57
+Revises: c5a7e2f90b14
+Create Date: 2026-10-17 15:12:44.903125
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81f4b6a2c57'
+down_revision: Union[str, None] = 'c5a7e2f90b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'upload_sessions',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('supplier_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('total_size', sa.BigInteger(), nullable=False),
+        sa.Column('received_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['supplier_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['job_id'], ['ingestion_jobs.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_upload_session_supplier_status', 'upload_sessions', ['supplier_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_upload_session_supplier_status', table_name='upload_sessions')
+    op.drop_table('upload_sessions')
@@ -0,0 +1,33 @@
+"""add product trigram indexes
+
+Revision ID: e3a6c9d1f274
+Revises: b9d4f7a2c861
+Create Date: 2026-10-17 22:47:31.906152
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a6c9d1f274'
+down_revision: Union[str, None] = 'b9d4f7a2c861'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_products_name_trgm', 'products', ['product_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'product_name': 'gin_trgm_ops'})
+    op.create_index('ix_products_brand_trgm', 'products', ['brand'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'brand': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_brand_trgm', table_name='products', postgresql_using='gin')
+    op.drop_index('ix_products_name_trgm', table_name='products', postgresql_using='gin')
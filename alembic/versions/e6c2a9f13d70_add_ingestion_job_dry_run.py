@@ -0,0 +1,28 @@
+"""add ingestion job dry run
+
+Revision ID: e6c2a9f13d70
+Revises: d81f4b6a2c57
+Create Date: 2026-10-17 16:02:18.660142
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c2a9f13d70'
+down_revision: Union[str, None] = 'd81f4b6a2c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ingestion_jobs', sa.Column('dry_run', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ingestion_jobs', 'dry_run')
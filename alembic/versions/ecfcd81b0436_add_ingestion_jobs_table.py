@@ -0,0 +1,53 @@
+"""add ingestion jobs table
+
+Revision ID: ecfcd81b0436
+Revises: e128beeb3bd9
+Create Date: 2026-10-17 09:12:04.531877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ecfcd81b0436'
+down_revision: Union[str, None] = 'e128beeb3bd9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ingestion_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('supplier_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('stage', sa.String(), nullable=True),
+        sa.Column('progress', sa.Integer(), nullable=False),
+        sa.Column('rows_processed', sa.Integer(), nullable=False),
+        sa.Column('files', sa.JSON(), nullable=False),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('worker_id', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['supplier_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ingestion_jobs_id'), 'ingestion_jobs', ['id'], unique=False)
+    op.create_index('idx_ingestion_job_status_created', 'ingestion_jobs', ['status', 'created_at'], unique=False)
+    op.create_index('idx_ingestion_job_supplier', 'ingestion_jobs', ['supplier_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_ingestion_job_supplier', table_name='ingestion_jobs')
+    op.drop_index('idx_ingestion_job_status_created', table_name='ingestion_jobs')
+    op.drop_index(op.f('ix_ingestion_jobs_id'), table_name='ingestion_jobs')
+    op.drop_table('ingestion_jobs')
@@ -0,0 +1,38 @@
+"""add product canonical id
+
+Revision ID: f3d9b5a8e217
+Revises: e6c2a9f13d70
+Create Date: 2026-10-17 17:21:44.318905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3d9b5a8e217'
+down_revision: Union[str, None] = 'e6c2a9f13d70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COMPACT_ID = r"upper(regexp_replace(product_id, '\s+', '', 'g'))"
+CANONICAL_ID_SQL = (
+    f"CASE WHEN {COMPACT_ID} ~ '^[0-9]+(\\.0*)?$' "
+    f"THEN coalesce(nullif(ltrim(regexp_replace({COMPACT_ID}, '\\.0*$', ''), '0'), ''), '0') "
+    f"ELSE nullif({COMPACT_ID}, '') END"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Adding a stored generated column rewrites the products table
+    op.add_column('products', sa.Column('canonical_id', sa.String(), sa.Computed(CANONICAL_ID_SQL, persisted=True)))
+    op.create_index('ix_supplier_canonical_id', 'products', ['supplier_id', 'canonical_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_supplier_canonical_id', table_name='products')
+    op.drop_column('products', 'canonical_id')
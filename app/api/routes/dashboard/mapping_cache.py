@@ -0,0 +1,19 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.core.role import role_required
+from app.models.user import User
+from app.services.ai_mapping.mapping_cache import MAPPING_TABLES, invalidate_mapping_cache
+
+router = APIRouter()
+
+
+@router.delete("/mapping-cache", summary="Invalidate cached column/image mappings")
+async def clear_mapping_cache(
+    kind: Optional[str] = Query(None, description="'column' or 'image'; all kinds when omitted"),
+    stale_only: bool = Query(False, description="only drop entries built for an older table schema"),
+    current_user: User = Depends(role_required(["admin"]))
+):
+    if kind and kind not in MAPPING_TABLES:
+        raise HTTPException(status_code=400, detail=f"Unknown mapping kind '{kind}'")
+    removed = await invalidate_mapping_cache(kind, stale_only)
+    return {"message": f"Removed {removed} cached mappings."}
@@ -7,6 +7,8 @@ from app.core.database import get_db
 from app.core.role import role_required
 from app.models.product import Product
 from app.models.product_image import ProductImage
+from app.models.supplier_details import UploadLog
+from app.services.product.search import full_text_search
 from app.schemas.product.product import (
     ProductResponse,
     PaginatedProductResponse
@@ -36,12 +38,10 @@ async def get_products(
         .options(selectinload(Product.images))
     )
 
+    rank = None
     if search:
-        query = query.where(
-            Product.product_name.ilike(f"%{search}%") |
-            Product.description.ilike(f"%{search}%") |
-            Product.keywords.ilike(f"%{search}%")
-        )
+        matches, rank = full_text_search(search)
+        query = query.where(matches)
     if category:
         query = query.where(Product.category.ilike(f"%{category}%"))
     if min_price is not None:
@@ -61,6 +61,8 @@ async def get_products(
             "per_page": per_page
         }
 
+    if rank is not None:
+        query = query.order_by(rank.desc(), Product.product_id)
     query = query.offset((page - 1) * per_page).limit(per_page)
     products = (await db.execute(query)).scalars().all()
 
@@ -119,7 +121,15 @@ async def hard_delete_all_products(
     )
     product_ids = [row[0] for row in product_ids_result.fetchall()]
 
+    # Earlier uploads are no longer in the catalog, so re-sending one must ingest it again
+    await db.execute(
+        update(UploadLog)
+        .where(UploadLog.supplier_id == current_user.id, UploadLog.content_hash.isnot(None))
+        .values(content_hash=None)
+    )
+
     if not product_ids:
+        await db.commit()
         return {"message": "No products found for this supplier."}
 
     await db.execute(
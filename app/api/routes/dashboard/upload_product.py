@@ -1,54 +1,162 @@
-from typing import List
-import asyncio
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.schemas.auth.auth import UserResponse
+from app.schemas.dashboard.upload_jobs import (
+    UploadJobCreatedResponse, UploadJobResponse, UploadSessionCreate, UploadSessionResponse
+)
 from app.core.role import role_required
-from app.models.product import Product
-from app.services.ai_mapping.column_mapping import generate_column_mapping
-from app.services.ai_mapping.image_mapping import generate_image_mapping
-from app.utils.sample_data import data_extraction, generate_preview
+from app.services.jobs.chunked_upload import (
+    close_upload_session, create_upload_session, finalize_upload_session, get_upload_session,
+    parse_content_range, write_chunk
+)
+from app.services.jobs.ingestion_queue import (
+    enqueue_job, find_duplicate_upload, get_job, remove_staged_files, stage_uploads, upload_digest
+)
+from app.services.product.rejected_rows import rejected_rows_path
 import logging
-from app.services.product.product_insertion import BulkInserter
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 
-@router.post("/upload-and-process")
+@router.post("/upload-and-process", status_code=202, response_model=UploadJobCreatedResponse)
 async def upload_process(
     files: List[UploadFile] = File(...),
+    dry_run: bool = Query(False, description="validate the upload and report problems without writing anything"),
+    force: bool = Query(False, description="ingest again even if a byte-identical upload was already ingested"),
     db: AsyncSession = Depends(get_db),
     user: UserResponse = Depends(role_required("supplier"))
 ) -> JSONResponse:
+    staged_files = []
     try:
         supplier_id = user.id
-        logger.info(f"Processing upload for supplier ID: {supplier_id}")
+        logger.info(f"Queueing upload for supplier ID: {supplier_id}")
 
-        sheets_data = await data_extraction(files)
-        all_sheet_preview = generate_preview(sheets_data)
+        staged_files = await stage_uploads(files)
 
-        column_map, image_map = await asyncio.gather(
-            generate_column_mapping(
-                all_sheet_preview=all_sheet_preview,
-                db_fields=Product.__table__.columns.keys()
-            ),
-            generate_image_mapping(all_sheet_preview=all_sheet_preview)
-        )
+        duplicate = None if dry_run or force else await find_duplicate_upload(db, supplier_id, upload_digest(staged_files))
+        if duplicate:
+            remove_staged_files(staged_files)
+            return JSONResponse(status_code=202, content=duplicate)
 
-        inserter = BulkInserter(db, supplier_id)
-        insert_results = await inserter.process_sheets(sheets_data, column_map, image_map)
+        job = await enqueue_job(db, supplier_id, staged_files, dry_run=dry_run)
 
-        return JSONResponse(content={
-            "column_mapping": column_map,
-            "image_mapping": image_map,
-            "result":insert_results
-        })
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
 
+    except HTTPException:
+        await db.rollback()
+        remove_staged_files(staged_files)
+        raise
     except Exception as e:
-        logger.error(f"Processing failed: {str(e)}", exc_info=True)
+        logger.error(f"Queueing upload failed: {str(e)}", exc_info=True)
+        await db.rollback()
+        remove_staged_files(staged_files)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/upload-jobs/{job_id}", response_model=UploadJobResponse)
+async def upload_job_status(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: UserResponse = Depends(role_required("supplier"))
+):
+    job = await get_job(db, job_id, user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
+
+
+@router.get("/upload-jobs/{job_id}/rejected-rows")
+async def download_rejected_rows(
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: UserResponse = Depends(role_required("supplier"))
+) -> FileResponse:
+    """CSV of the rows the job could not load, streamed from disk"""
+    job = await get_job(db, job_id, user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    if job.status not in ("done", "failed"):
+        raise HTTPException(status_code=409, detail=f"Upload job is {job.status}.")
+    path = rejected_rows_path(job.id)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="No rejected rows for this upload job")
+    return FileResponse(path, media_type="text/csv", filename=f"upload_{job.id}_rejected_rows.csv")
+
+
+@router.post("/uploads", status_code=201, response_model=UploadSessionResponse)
+async def create_chunked_upload(
+    payload: UploadSessionCreate,
+    db: AsyncSession = Depends(get_db),
+    user: UserResponse = Depends(role_required("supplier"))
+):
+    """Open a resumable upload; send the file with PUT byte ranges, then finalize"""
+    return await create_upload_session(db, user.id, payload.filename, payload.size, payload.sha256)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def chunked_upload_status(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    user: UserResponse = Depends(role_required("supplier"))
+):
+    """received_bytes is the offset the next chunk must start at"""
+    return await get_upload_session(db, upload_id, user.id)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    content_range: Optional[str] = Header(None),
+    x_chunk_sha256: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    user: UserResponse = Depends(role_required("supplier"))
+):
+    session = await get_upload_session(db, upload_id, user.id)
+    start, end = parse_content_range(content_range, session.total_size)
+    try:
+        return await write_chunk(db, session, start, end, x_chunk_sha256, request.stream())
+    except HTTPException:
         await db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise
+
+
+@router.post("/uploads/{upload_id}/finalize", status_code=202, response_model=UploadJobCreatedResponse)
+async def finalize_chunked_upload(
+    upload_id: str,
+    dry_run: bool = Query(False, description="validate the upload and report problems without writing anything"),
+    force: bool = Query(False, description="ingest again even if a byte-identical upload was already ingested"),
+    db: AsyncSession = Depends(get_db),
+    user: UserResponse = Depends(role_required("supplier"))
+) -> JSONResponse:
+    session = await get_upload_session(db, upload_id, user.id)
+    staged = await finalize_upload_session(db, session)
+
+    duplicate = None if dry_run or force else await find_duplicate_upload(db, user.id, upload_digest([staged]))
+    if duplicate:
+        await close_upload_session(db, session, "finalized", duplicate["job_id"])
+        remove_staged_files([staged])
+        return JSONResponse(status_code=202, content=duplicate)
+
+    # Marked before enqueueing so the job and the status commit together
+    session.status = "finalized"
+    job = await enqueue_job(db, user.id, [staged], dry_run=dry_run)
+    await close_upload_session(db, session, "finalized", job.id)
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def abort_chunked_upload(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    user: UserResponse = Depends(role_required("supplier"))
+):
+    session = await get_upload_session(db, upload_id, user.id, for_update=True)
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session.status}.")
+    await close_upload_session(db, session, "aborted")
@@ -7,9 +7,12 @@ from typing import Optional
 from app.core.database import get_db
 from app.models.product import Product
 from app.models.product_image import ProductImage
+from app.services.product.search import full_text_search
+from app.services.product.suggest import suggest_products
 from app.schemas.product.product import (
     ProductResponse,
-    PaginatedProductResponse
+    PaginatedProductResponse,
+    ProductSuggestionsResponse
 )
 
 router = APIRouter()
@@ -31,12 +34,10 @@ async def get_products(
         .options(selectinload(Product.images))
     )
 
+    rank = None
     if search:
-        query = query.where(
-            Product.product_name.ilike(f"%{search}%") |
-            Product.description.ilike(f"%{search}%") |
-            Product.keywords.ilike(f"%{search}%")
-        )
+        matches, rank = full_text_search(search)
+        query = query.where(matches)
     if category:
         query = query.where(Product.category.ilike(f"%{category}%"))
     if min_price is not None:
@@ -56,6 +57,8 @@ async def get_products(
             "per_page": per_page
         }
 
+    if rank is not None:
+        query = query.order_by(rank.desc(), Product.product_id)
     query = query.offset((page - 1) * per_page).limit(per_page)
     products = (await db.execute(query)).scalars().all()
 
@@ -68,6 +71,17 @@ async def get_products(
     }
 
 
+@router.get("/products/suggest", response_model=ProductSuggestionsResponse)
+async def suggest(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    db: AsyncSession = Depends(get_db),
+):
+    """Search-as-you-type: product names and brands similar to a partly typed term"""
+    suggestions = await suggest_products(db, q, limit)
+    return {"query": q, **suggestions}
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: str,
@@ -7,7 +7,9 @@ from app.api.routes.auth.refresh import router as refresh_router
 from app.api.routes.dashboard.upload_product import router as supplier_product_routes
 from app.api.routes.dashboard.dashboard import router as dashboard_routes
 from app.api.routes.dashboard.product import router as dash_product_routes
+from app.api.routes.dashboard.mapping_cache import router as mapping_cache_routes
 from app.api.routes.product.productapis import router as product_routes
+from app.api.routes.monitoring.metrics import router as metrics_routes
 
 
 router = APIRouter()
@@ -18,7 +20,10 @@ router.include_router(google_router,prefix="/auth", tags=["Auth"])
 router.include_router(refresh_router,prefix="/auth", tags=["Auth"])
 router.include_router(supplier_product_routes,prefix="/dashboard", tags=["Dashboard"])
 router.include_router(dashboard_routes,prefix="/dashboard", tags=["Dashboard"])
+router.include_router(mapping_cache_routes,prefix="/dashboard", tags=["Dashboard"])
 router.include_router(dash_product_routes,prefix="/dashboard", tags=["Dashboard"])
+# Before product_routes, whose "/{product_id}" would otherwise match "/metrics"
+router.include_router(metrics_routes, tags=["Monitoring"])
 router.include_router(product_routes, tags=["Product"])
 
 
@@ -1,4 +1,5 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
@@ -30,6 +31,8 @@ Base = declarative_base()
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
+        # The products table's trigram indexes need pg_trgm to exist first
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
 
 async def get_db():
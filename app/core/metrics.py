@@ -0,0 +1,73 @@
+"""Prometheus metrics for the ingestion pipeline.
+
+Every stage of an upload (spool, extract, profile, mapping, parse, clean,
+product_write, id_refresh, image_match, image_write) reports its duration,
+throughput and batch size, labelled by file format. The API serves them on
+/metrics; workers serve their own registry over HTTP (see app.worker
+--metrics-port).
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+import time
+from prometheus_client import Counter, Histogram
+
+STAGE_SECONDS_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+ROWS_PER_SECOND_BUCKETS = (100, 500, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+BATCH_ROWS_BUCKETS = (1, 10, 100, 500, 1000, 2000, 5000, 10000, 25000, 50000, 100000)
+
+# File extensions collapse to a fixed label set to keep cardinality bounded
+FORMAT_LABELS = {
+    ".csv": "csv", ".xlsx": "xlsx", ".xls": "xls", ".parquet": "parquet", ".pq": "parquet",
+    ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow", ".arrows": "arrow", ".jsonl": "jsonl", ".ndjson": "jsonl",
+}
+
+STAGE_SECONDS = Histogram(
+    "ingestion_stage_duration_seconds", "Time spent in one ingestion stage or batch",
+    ["stage", "format"], buckets=STAGE_SECONDS_BUCKETS,
+)
+STAGE_ROWS_PER_SECOND = Histogram(
+    "ingestion_stage_rows_per_second", "Throughput of one ingestion stage or batch",
+    ["stage", "format"], buckets=ROWS_PER_SECOND_BUCKETS,
+)
+BATCH_ROWS = Histogram(
+    "ingestion_batch_rows", "Rows handled per batch",
+    ["stage", "format"], buckets=BATCH_ROWS_BUCKETS,
+)
+STAGE_ROWS = Counter("ingestion_stage_rows", "Rows handled by an ingestion stage", ["stage", "format"])
+STAGE_BYTES = Counter("ingestion_stage_bytes", "Bytes handled by an ingestion stage", ["stage", "format"])
+JOBS = Counter("ingestion_jobs", "Finished ingestion jobs", ["status", "format"])
+
+
+def file_format(filenames: Iterable[str]) -> str:
+    """Format label of an upload: the shared format of its files, or 'mixed'"""
+    labels = {FORMAT_LABELS.get(Path(name).suffix.lower(), "other") for name in filenames}
+    if not labels:
+        return "unknown"
+    return labels.pop() if len(labels) == 1 else "mixed"
+
+
+def observe_stage(stage: str, fmt: str, seconds: float, rows: Optional[int] = None,
+                  batch: bool = False) -> None:
+    """Record one timed unit of work; `batch` also records its size"""
+    STAGE_SECONDS.labels(stage, fmt).observe(seconds)
+    if rows is None:
+        return
+    STAGE_ROWS.labels(stage, fmt).inc(rows)
+    if rows and seconds > 0:
+        STAGE_ROWS_PER_SECOND.labels(stage, fmt).observe(rows / seconds)
+    if batch:
+        BATCH_ROWS.labels(stage, fmt).observe(rows)
+
+
+@contextmanager
+def track_stage(stage: str, fmt: str, batch: bool = False) -> Iterator[Dict[str, int]]:
+    """Time a block; set `rows` (and optionally `bytes`) on the yielded dict to record throughput"""
+    record: Dict[str, int] = {}
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        observe_stage(stage, fmt, time.perf_counter() - started, record.get("rows"), batch)
+        if record.get("bytes"):
+            STAGE_BYTES.labels(stage, fmt).inc(record["bytes"])
@@ -0,0 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import multiprocessing
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("PARSE_POOL_WORKERS", min(os.cpu_count() or 4, 8)))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def init_process_pool(max_workers: int = MAX_WORKERS) -> ProcessPoolExecutor:
+    """Create the app-wide pool used for CPU-bound file parsing"""
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that already runs an event loop and DB pool is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        logger.info(f"Started parse process pool with {max_workers} workers")
+    return _process_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    return _process_pool or init_process_pool()
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
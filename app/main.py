@@ -7,6 +7,7 @@ from dotenv import load_dotenv
 import os
 from app.api.version1.route_init import router
 from app.core.database import Base, engine, init_db
+from app.core.process_pool import init_process_pool, shutdown_process_pool
 from fastapi.openapi.utils import get_openapi
 
 # Load environment variables
@@ -19,7 +20,9 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 async def lifespan(app: FastAPI):
     """Async context manager for application lifespan"""
     await init_db()
+    init_process_pool()
     yield
+    shutdown_process_pool()
 
 def create_app() -> FastAPI:
     """Factory function for creating the FastAPI application"""
@@ -3,6 +3,9 @@ from app.models.user import User
 from app.models.product import Product
 from app.models.product_image import ProductImage
 from app.models.supplier_details import UploadLog,Certification
+from app.models.ingestion_job import IngestionJob
+from app.models.mapping_cache import ColumnMappingCache
+from app.models.upload_session import UploadSession
 
 
-__all__ = ["User", "Product", "ProductImage","UploadLog", "Certification"]
\ No newline at end of file
+__all__ = ["User", "Product", "ProductImage","UploadLog", "Certification", "IngestionJob", "ColumnMappingCache", "UploadSession"]
\ No newline at end of file
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, JSON, Index, func
+from app.core.database import Base
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    supplier_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String, nullable=False, default="queued")
+    stage = Column(String, nullable=True)
+    progress = Column(Integer, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    queue_position = Column(Integer, nullable=True)
+    # Last committed position of a batch-mode upload (sheet and row offset); a retry resumes from it
+    checkpoint = Column(JSON, nullable=True)
+    files = Column(JSON, nullable=False)
+    dry_run = Column(Boolean, nullable=False, default=False)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("idx_ingestion_job_status_created", "status", "created_at"),
+        Index("idx_ingestion_job_supplier", "supplier_id"),
+    )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index, func
+from app.core.database import Base
+
+
+class ColumnMappingCache(Base):
+    __tablename__ = "column_mapping_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(16), nullable=False)
+    signature = Column(String(64), nullable=False)
+    schema_version = Column(String(64), nullable=False)
+    mapping = Column(JSON, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("uix_mapping_cache_key", "kind", "signature", "schema_version", unique=True),
+    )
@@ -1,10 +1,29 @@
 # models/product.py
 import uuid
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, UUID, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, DateTime, ForeignKey, Text, UUID, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime, timezone
 from app.core.database import Base
 
+# Same normalization as canonical_keys() in services/product/id_index.py: no
+# whitespace, upper case, and numeric IDs without leading zeros or a trailing '.0'
+_COMPACT_ID = r"upper(regexp_replace(product_id, '\s+', '', 'g'))"
+CANONICAL_ID_SQL = (
+    f"CASE WHEN {_COMPACT_ID} ~ '^[0-9]+(\\.0*)?$' "
+    f"THEN coalesce(nullif(ltrim(regexp_replace({_COMPACT_ID}, '\\.0*$', ''), '0'), ''), '0') "
+    f"ELSE nullif({_COMPACT_ID}, '') END"
+)
+
+# Full-text document for catalog search: a match in the name ranks above one in
+# the keywords, which ranks above one in the description
+SEARCH_CONFIG = "english"
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(product_name, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(keywords, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(description, '')), 'C')"
+)
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -19,6 +38,10 @@ class Product(Base):
     item_weight = Column(Float)
     keywords=Column(String)
     is_active = Column(Boolean, default=True)
+    content_hash = Column(BigInteger, nullable=True)
+    canonical_id = Column(String, Computed(CANONICAL_ID_SQL, persisted=True))
+    # Only read by search filters; loading it with every product would be wasted I/O
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
     # created_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc))
    
     supplier = relationship("User", back_populates="products")
@@ -27,4 +50,10 @@ class Product(Base):
 
     __table_args__ = (
         Index("ix_supplier_product_id", "supplier_id", "product_id", unique=True),
+        Index("ix_supplier_canonical_id", "supplier_id", "canonical_id"),
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        # pg_trgm indexes behind search-as-you-type suggestions
+        Index("ix_products_name_trgm", "product_name", postgresql_using="gin",
+              postgresql_ops={"product_name": "gin_trgm_ops"}),
+        Index("ix_products_brand_trgm", "brand", postgresql_using="gin", postgresql_ops={"brand": "gin_trgm_ops"}),
     )
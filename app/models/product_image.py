@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Index
+from sqlalchemy import Column, String, Integer, BigInteger, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -24,6 +24,7 @@ class ProductImage(Base):
 
     msds_image = Column(String, nullable=True)
     msds_image_url = Column(String, nullable=True)
+    content_hash = Column(BigInteger, nullable=True)
 
     product = relationship("Product", back_populates="images")
 
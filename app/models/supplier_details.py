@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime,Date,Text,Index
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime,Date,Text,Index,JSON
 from app.core.database import Base
 from sqlalchemy.orm import relationship
 from datetime import date
@@ -11,11 +11,15 @@ class UploadLog(Base):
     status = Column(String)  
     message = Column(String)
     timestamp = Column(DateTime)
+    content_hash = Column(String(64), nullable=True)
+    job_id = Column(Integer, ForeignKey("ingestion_jobs.id", ondelete="SET NULL"), nullable=True)
+    result = Column(JSON, nullable=True)
 
     supplier = relationship("User", back_populates="upload_logs")
     __table_args__ = (
         Index("idx_uploadlog_supplier_status", "supplier_id", "status"),
         Index("idx_uploadlog_status", "status"),
+        Index("idx_uploadlog_supplier_hash", "supplier_id", "content_hash"),
     )
 
 
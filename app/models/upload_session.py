@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Index, func
+from app.core.database import Base
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)
+    supplier_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    filename = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    received_bytes = Column(BigInteger, nullable=False, default=0)
+    sha256 = Column(String(64), nullable=True)
+    status = Column(String, nullable=False, default="open")
+    job_id = Column(Integer, ForeignKey("ingestion_jobs.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_upload_session_supplier_status", "supplier_id", "status"),
+    )
@@ -0,0 +1,48 @@
+from pydantic import BaseModel, ConfigDict
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class UploadJobCreatedResponse(BaseModel):
+    job_id: Optional[int] = None
+    status: str
+    duplicate: bool = False
+    result: Optional[Dict[str, Any]] = None
+
+
+class UploadJobResponse(BaseModel):
+    id: int
+    status: str
+    dry_run: bool = False
+    stage: Optional[str] = None
+    progress: int
+    rows_processed: int
+    queue_position: Optional[int] = None
+    checkpoint: Optional[Dict[str, Any]] = None
+    attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    filename: str
+    total_size: int
+    received_bytes: int
+    status: str
+    job_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -36,6 +36,12 @@ class ProductResponse(ProductBase):
     }
 
 
+class ProductSuggestionsResponse(BaseModel):
+    query: str
+    names: List[str] = []
+    brands: List[str] = []
+
+
 class PaginatedProductResponse(BaseModel):
     items: List[ProductResponse]
     total: int
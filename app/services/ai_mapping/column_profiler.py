@@ -0,0 +1,148 @@
+from typing import Any, Dict, List
+import json
+import numpy as np
+import pandas as pd
+from app.utils.sample_data import SheetData
+
+PROFILE_ROWS = 500
+EXAMPLE_VALUES = 3
+EXAMPLE_MAX_CHARS = 40
+# A pattern names a column once this share of its filled cells matches it
+PATTERN_MIN_RATIO = 0.8
+
+URL_RE = r'^(?:https?://|www\.)\S+$'
+PDF_RE = r'\.pdf(?:$|\?)'
+DATE_RE = r'^\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?$'
+EMAIL_RE = r'^[^@\s]+@[^@\s]+\.[a-zA-Z]{2,}$'
+SKU_MAX_LEN = 30
+SKU_RE = r'^(?=[^\s]*\d)[A-Za-z0-9]+(?:[-_.][A-Za-z0-9]+){0,3}$'
+BOOL_VALUES = {'yes', 'no', 'true', 'false', 'y', 'n', '1', '0', 'active', 'inactive'}
+NULL_VALUES = {'', 'null', 'none', 'nan', 'n/a', 'na', '-'}
+
+
+def _long_sample(sample: pd.DataFrame) -> pd.DataFrame:
+    """All cells of the sample as one (column position, text) frame, so each check runs once per sheet"""
+    cells = pd.DataFrame({
+        "col": np.repeat(np.arange(sample.shape[1]), len(sample)),
+        "raw": sample.to_numpy(dtype=object).ravel(order="F"),
+    })
+    text = cells["raw"].astype(str).str.strip()
+    cells["filled"] = cells["raw"].notna() & ~text.str.lower().isin(NULL_VALUES)
+    cells["text"] = text
+    return cells
+
+
+def _pattern(ratios: Dict[str, float], unique: float, avg_len: float) -> str:
+    """Regex class shared by most filled cells of a column"""
+    if ratios["pdf"] >= 0.5:
+        return "pdf_url"
+    for name in ("url", "email", "date"):
+        if ratios[name] >= PATTERN_MIN_RATIO:
+            return name
+    if ratios["bool"] >= PATTERN_MIN_RATIO and unique <= 0.1:
+        return "boolean"
+    if ratios["integer"] >= PATTERN_MIN_RATIO:
+        return "integer"
+    if ratios["numeric"] >= PATTERN_MIN_RATIO:
+        return "decimal"
+    if ratios["sku"] >= PATTERN_MIN_RATIO and avg_len <= 40:
+        return "sku"
+    return "long_text" if avg_len > 80 else "text"
+
+
+def profile_frame(sample: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Compact profile of every column of a sample frame, in column order.
+
+    Each profile carries the inferred type, null ratio, cardinality, length
+    stats, the dominant regex class and a few distinct example values, plus the
+    per-pattern match ratios the heuristic mapper scores with.
+    """
+    cells = _long_sample(sample)
+    rows = max(len(sample), 1)
+    filled = cells[cells["filled"]].copy()
+    # Sheets repeat values heavily, so every check runs once per distinct value
+    codes, uniques = pd.factorize(filled["text"])
+    text = pd.Series(uniques, dtype=object)
+    numeric = pd.to_numeric(text.str.replace(r'[$,\s]', '', regex=True), errors='coerce')
+    checks = {
+        "numeric": numeric.notna(),
+        "integer": numeric.notna() & (numeric % 1 == 0),
+        "url": text.str.match(URL_RE, case=False),
+        "pdf": text.str.contains(PDF_RE, case=False),
+        "email": text.str.match(EMAIL_RE),
+        "date": text.str.match(DATE_RE),
+        "bool": text.str.lower().isin(BOOL_VALUES),
+        "sku": text.str.match(SKU_RE) & (text.str.len() <= SKU_MAX_LEN),
+        "length": text.str.len(),
+    }
+    for name, values in checks.items():
+        filled[name] = values.to_numpy()[codes]
+
+    checks = [name for name in checks if name != "length"]
+    grouped = filled.groupby("col", sort=False)
+    ratios = grouped[checks].mean()
+    lengths = grouped["length"].agg(["min", "mean", "max"])
+    counts = grouped.size()
+    distinct = grouped["text"].nunique()
+    examples = filled.drop_duplicates(["col", "text"]).groupby("col", sort=False).head(EXAMPLE_VALUES) \
+        .groupby("col", sort=False)["text"].agg(list)
+
+    profiles = []
+    for position, name in enumerate(sample.columns):
+        count = int(counts.get(position, 0))
+        profile: Dict[str, Any] = {"name": str(name), "filled": count / rows, "null_ratio": 1 - count / rows}
+        if not count:
+            profiles.append({**profile, "type": "empty", "pattern": "empty", "cardinality": 0, "examples": []})
+            continue
+        column_ratios = {check: float(ratios.at[position, check]) for check in checks}
+        unique = distinct[position] / count
+        avg_len = float(lengths.at[position, "mean"])
+        profiles.append({
+            **profile,
+            "type": pd.api.types.infer_dtype(sample.iloc[:, position].dropna(), skipna=True),
+            "pattern": _pattern(column_ratios, unique, avg_len),
+            "cardinality": int(distinct[position]),
+            "unique": unique,
+            "min_len": int(lengths.at[position, "min"]),
+            "avg_len": avg_len,
+            "max_len": int(lengths.at[position, "max"]),
+            "examples": [value[:EXAMPLE_MAX_CHARS] for value in examples.get(position, [])],
+            **column_ratios,
+        })
+    return profiles
+
+
+def profile_sheets(sheets_data: List[SheetData], rows: int = PROFILE_ROWS) -> List[Dict[str, Any]]:
+    """Column profiles of the first `rows` rows of every sheet"""
+    profiles = []
+    for sheet_name, columns, frames in sheets_data:
+        sample = frames.head(rows)
+        sample = sample[[col for col in columns if col in sample.columns]]
+        profiles.append({"sheet_name": sheet_name, "rows_sampled": len(sample), "columns": profile_frame(sample)})
+    return profiles
+
+
+def profiles_by_column(sheet_profiles: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """First profile seen for each column name across sheets"""
+    by_column: Dict[str, Dict[str, Any]] = {}
+    for sheet in sheet_profiles:
+        for profile in sheet["columns"]:
+            by_column.setdefault(profile["name"], profile)
+    return by_column
+
+
+def format_profiles(sheet_profiles: List[Dict[str, Any]]) -> str:
+    """One line per column, for LLM prompts; headers are JSON-quoted"""
+    lines = []
+    for sheet in sheet_profiles:
+        lines.append(f"Sheet {json.dumps(sheet['sheet_name'])} ({sheet['rows_sampled']} rows sampled):")
+        for p in sheet["columns"]:
+            if p["pattern"] == "empty":
+                lines.append(f"- {json.dumps(p['name'])} | empty")
+                continue
+            examples = ", ".join(json.dumps(value) for value in p["examples"])
+            lines.append(
+                f"- {json.dumps(p['name'])} | {p['pattern']} ({p['type']}) | nulls {p['null_ratio']:.0%} | "
+                f"distinct {p['cardinality']} | len {p['min_len']}-{p['max_len']} avg {p['avg_len']:.0f} | e.g. {examples}"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,168 @@
+from difflib import SequenceMatcher
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import re
+from app.models.product import Product
+from app.models.product_image import ProductImage
+from app.services.ai_mapping.column_profiler import profile_sheets, profiles_by_column
+from app.services.ai_mapping.mapping_cache import cached_mapping
+from app.utils.sample_data import SheetData
+
+logger = logging.getLogger(__name__)
+
+HEURISTIC_CONFIDENCE_THRESHOLD = float(os.getenv("HEURISTIC_CONFIDENCE_THRESHOLD", "0.75"))
+MIN_FIELD_SCORE = 0.5
+MIN_NAME_SCORE = 0.5
+NAME_WEIGHT = 0.6
+VALUE_WEIGHT = 0.4
+
+# field -> (header synonyms, expected value kind)
+PRODUCT_FIELD_HINTS: Dict[str, Tuple[List[str], str]] = {
+    'product_id': (['product id', 'sku', 'item code', 'item number', 'item no', 'part number', 'part no',
+                    'article number', 'product code', 'model number', 'upc', 'pid', 'item id', 'id'], 'id'),
+    'product_name': (['product name', 'name', 'title', 'item name', 'product title', 'item description'], 'text_short'),
+    'price': (['price', 'unit price', 'list price', 'cost', 'msrp', 'retail price', 'sale price', 'rate'], 'number'),
+    'description': (['description', 'long description', 'product description', 'details', 'about product',
+                     'features', 'specifications'], 'text_long'),
+    'brand': (['brand', 'brand name', 'manufacturer', 'manufacturer name', 'make', 'mfr', 'vendor'], 'text_short'),
+    'category': (['category', 'product category', 'type', 'product type', 'department', 'class', 'group'], 'text_short'),
+    'stock_qty': (['stock qty', 'stock', 'quantity', 'qty', 'inventory', 'on hand', 'available qty'], 'integer'),
+    'item_weight': (['item weight', 'weight', 'net weight', 'gross weight', 'wt'], 'number'),
+    'keywords': (['keywords', 'tags', 'search terms', 'search keywords'], 'text'),
+    'is_active': (['is active', 'active', 'status', 'enabled'], 'bool'),
+}
+
+IMAGE_FIELD_HINTS: Dict[str, Tuple[List[str], str]] = {
+    'main_image': (['main image', 'image', 'image url', 'primary image', 'picture', 'photo', 'img', 'image 1'], 'url'),
+    **{f'image_variant{n}': ([f'image variant {n}', f'image {n + 1}', f'additional image {n}', f'image url {n + 1}',
+                              f'img {n + 1}', f'variant image {n}'], 'url') for n in range(1, 6)},
+    'alt_image': (['alt image', 'alternate image', 'alternative image', 'alt img'], 'url'),
+    **{f'alt_image_variant{n}': ([f'alt image variant {n}', f'alt image {n + 1}', f'alternate image {n + 1}'], 'url')
+       for n in range(1, 4)},
+    'brand_logo_image': (['brand logo image', 'brand logo', 'logo', 'logo image'], 'url'),
+    'brand_logo_image_url': (['brand logo image url', 'brand logo url', 'logo url'], 'url'),
+    'msds_image': (['msds image', 'msds', 'sds', 'safety data sheet', 'msds file'], 'pdf'),
+    'msds_image_url': (['msds image url', 'msds url', 'sds url', 'safety data sheet url'], 'pdf'),
+}
+
+
+def _normalize(header: str) -> str:
+    header = re.sub(r'([a-z])([A-Z])', r'\1 \2', str(header))
+    return re.sub(r'[^a-z0-9]+', ' ', header.lower()).strip()
+
+
+def _value_score(kind: str, stats: Dict[str, Any]) -> float:
+    if not stats.get('filled'):
+        return 0.0
+    text_ratio = 1.0 - stats['numeric']
+    if kind == 'id':
+        return stats['unique'] * (1.0 if stats['avg_len'] <= 40 else 0.3) * (1.0 - stats['url'])
+    if kind == 'number':
+        return stats['numeric'] * (1.0 - stats['date'])
+    if kind == 'integer':
+        return stats['integer'] * (1.0 - stats['date'])
+    if kind == 'bool':
+        return stats['bool']
+    if kind == 'url':
+        return stats['url'] * (1.0 - stats['pdf'] * 0.5)
+    if kind == 'pdf':
+        return stats['pdf']
+    if kind == 'text_long':
+        return text_ratio * (1.0 - stats['url']) * min(stats['avg_len'] / 120.0, 1.0)
+    if kind == 'text_short':
+        return text_ratio * (1.0 - stats['url']) * (1.0 if 2 <= stats['avg_len'] <= 120 else 0.4)
+    return text_ratio * (1.0 - stats['url'])
+
+
+def _name_score(header: str, synonyms: List[str]) -> float:
+    tokens = set(header.split())
+    best = 0.0
+    for synonym in synonyms:
+        if header == synonym:
+            return 1.0
+        score = SequenceMatcher(None, header, synonym).ratio()
+        synonym_tokens = set(synonym.split())
+        if synonym_tokens <= tokens:
+            # every word of the synonym appears in the header, e.g. "unit price (usd)"
+            score = max(score, 0.75 + 0.2 * len(synonym_tokens) / len(tokens))
+        best = max(best, score)
+    return best
+
+
+def _profile_columns(sheets_data: List[SheetData],
+                     profiles: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    return profiles_by_column(profiles if profiles is not None else profile_sheets(sheets_data))
+
+
+def _assign(hints: Dict[str, Tuple[List[str], str]], profiles: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Optional[str]], Dict[str, float]]:
+    candidates = []
+    for field, (synonyms, kind) in hints.items():
+        for col, stats in profiles.items():
+            name_score = _name_score(_normalize(col), synonyms)
+            if name_score < MIN_NAME_SCORE:
+                continue
+            score = NAME_WEIGHT * name_score + VALUE_WEIGHT * _value_score(kind, stats)
+            if score >= MIN_FIELD_SCORE:
+                candidates.append((score, field, col))
+
+    # Greedy one-to-one assignment, best scoring pairs first
+    mapping: Dict[str, Optional[str]] = {field: None for field in hints}
+    scores: Dict[str, float] = {}
+    used_columns = set()
+    for score, field, col in sorted(candidates, key=lambda c: c[0], reverse=True):
+        if mapping[field] is None and col not in used_columns:
+            mapping[field] = col
+            scores[field] = score
+            used_columns.add(col)
+    return mapping, scores
+
+
+def heuristic_column_mapping(sheets_data: List[SheetData],
+                             profiles: Optional[List[Dict[str, Any]]] = None) -> Tuple[Dict[str, Optional[str]], float]:
+    """Map sheet columns onto Product fields locally; returns (mapping, confidence)"""
+    hints = {field: hint for field, hint in PRODUCT_FIELD_HINTS.items() if field in Product.__table__.columns}
+    mapping, scores = _assign(hints, _profile_columns(sheets_data, profiles))
+    if not mapping.get('product_id') or not scores:
+        return mapping, 0.0
+    return mapping, sum(scores.values()) / len(scores)
+
+
+def heuristic_image_mapping(sheets_data: List[SheetData],
+                            profiles: Optional[List[Dict[str, Any]]] = None) -> Tuple[Dict[str, Optional[str]], float]:
+    """Map sheet columns onto ProductImage fields locally; returns (mapping, confidence)"""
+    hints = {field: hint for field, hint in IMAGE_FIELD_HINTS.items() if field in ProductImage.__table__.columns}
+    profiles = _profile_columns(sheets_data, profiles)
+    mapping, scores = _assign(hints, profiles)
+    if not scores:
+        # Confident there are no images only if no column carries links or documents
+        has_links = any(stats.get('url', 0) + stats.get('pdf', 0) > 0.3 for stats in profiles.values())
+        return mapping, 0.0 if has_links else 1.0
+    return mapping, sum(scores.values()) / len(scores)
+
+
+HEURISTIC_MAPPERS = {
+    "column": heuristic_column_mapping,
+    "image": heuristic_image_mapping,
+}
+
+
+async def resolve_mapping(
+    kind: str,
+    sheets_data: List[SheetData],
+    generate: Callable[[], Awaitable[Dict[str, Optional[str]]]],
+    signature: Optional[str] = None,
+    profiles: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Optional[str]]:
+    """Use the local mapping when it is confident, otherwise the cached/LLM one (local on failure)"""
+    mapping, confidence = HEURISTIC_MAPPERS[kind](sheets_data, profiles)
+    if confidence >= HEURISTIC_CONFIDENCE_THRESHOLD:
+        logger.info(f"Heuristic {kind} mapping accepted (confidence {confidence:.2f})")
+        return mapping
+
+    logger.info(f"Heuristic {kind} mapping confidence {confidence:.2f} below threshold, consulting LLM")
+    try:
+        return await cached_mapping(kind, sheets_data, generate, signature)
+    except Exception as e:
+        logger.warning(f"LLM {kind} mapping failed, using heuristic mapping: {e}")
+        return mapping
@@ -0,0 +1,228 @@
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import random
+from google import genai
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Calls one process runs at once; LLM_GLOBAL_MAX_CONCURRENCY caps them across all API and worker processes
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_GLOBAL_MAX_CONCURRENCY = int(os.getenv("LLM_GLOBAL_MAX_CONCURRENCY", "4"))
+LLM_SLOT_POLL_INTERVAL = float(os.getenv("LLM_SLOT_POLL_INTERVAL", "0.2"))
+# Advisory lock (LLM_SLOT_LOCK_CLASS, n) stands for global call slot n
+LLM_SLOT_LOCK_CLASS = 0x4C4C4D
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "30"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))
+# Point at a local stub (python -m app.services.ai_mapping.llm_stub_server) to run offline
+LLM_BASE_URL = os.getenv("LLM_BASE_URL")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Called with the caller's 1-based place in the queue while it waits, then 0 once its call starts
+QueueCallback = Callable[[int], Awaitable[None]]
+LLMCall = Callable[[str, str], Awaitable[str]]
+
+_client: Optional[genai.Client] = None
+
+
+def _gemini_client() -> genai.Client:
+    global _client
+    if _client is None:
+        if not GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY is not set; LLM mapping is unavailable.")
+        options = types.HttpOptions(base_url=LLM_BASE_URL) if LLM_BASE_URL else None
+        _client = genai.Client(api_key=GEMINI_API_KEY, http_options=options)
+    return _client
+
+
+async def gemini_generate(model: str, prompt: str) -> str:
+    """One Gemini call on the native async client, so a deadline really cancels it"""
+    response = await _gemini_client().aio.models.generate_content(model=model, contents=prompt)
+    return response.text
+
+
+def request_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+
+
+class AdvisorySlots:
+    """Call slots shared by every process, held as Postgres advisory locks.
+
+    Slot n is the session lock (LLM_SLOT_LOCK_CLASS, n), taken on a connection
+    of its own for the length of the call, so a process that dies mid-call gives
+    its slot back when the server drops the connection.
+    """
+
+    def __init__(self, slots: int, poll_interval: float = LLM_SLOT_POLL_INTERVAL):
+        self.slots = max(1, slots)
+        self.poll_interval = poll_interval
+
+    @asynccontextmanager
+    async def hold(self, timeout: float) -> AsyncIterator[None]:
+        from sqlalchemy import text
+        from app.core.database import engine
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        async with engine.connect() as conn:
+            slot = await self._take(conn, text)
+            while slot is None:
+                if loop.time() >= deadline:
+                    raise TimeoutError(f"Waited more than {timeout:g}s for a global LLM slot")
+                await asyncio.sleep(self.poll_interval)
+                slot = await self._take(conn, text)
+            try:
+                yield
+            finally:
+                try:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:lock_class, :slot)"),
+                                       {"lock_class": LLM_SLOT_LOCK_CLASS, "slot": slot})
+                    await conn.commit()
+                except BaseException:
+                    # A connection still holding the lock must not go back to the pool
+                    await conn.invalidate()
+                    raise
+
+    async def _take(self, conn, text) -> Optional[int]:
+        # Random order spreads the processes over the slots instead of all probing slot 0 first
+        for slot in random.sample(range(self.slots), self.slots):
+            taken = (await conn.execute(text("SELECT pg_try_advisory_lock(:lock_class, :slot)"),
+                                        {"lock_class": LLM_SLOT_LOCK_CLASS, "slot": slot})).scalar()
+            await conn.commit()
+            if taken:
+                return slot
+        return None
+
+
+@dataclass
+class _Flight:
+    task: Optional[asyncio.Task] = None
+    listeners: List[QueueCallback] = field(default_factory=list)
+    position: Optional[int] = None
+
+
+class LLMBroker:
+    """Front door for every LLM call made while mapping uploads.
+
+    Identical requests (same model and prompt) that are in flight at the same
+    time share one call. At most `max_concurrency` calls of this process run at
+    once; the rest wait in FIFO order and are told their queue position as it
+    changes. With `slots`, a call also needs one of the slots shared by all
+    processes, which caps the total across API and worker processes. Waiting
+    longer than `queue_timeout` or a call running past `call_timeout` raises
+    TimeoutError, which the mapping layer treats like any other LLM failure.
+    """
+
+    def __init__(self, call: LLMCall = gemini_generate, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 call_timeout: float = LLM_CALL_TIMEOUT, queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 slots: Optional[AdvisorySlots] = None):
+        self.call = call
+        self.max_concurrency = max(1, max_concurrency)
+        self.slots = slots
+        self.call_timeout = call_timeout
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiting: Deque[Tuple[asyncio.Future, _Flight]] = deque()
+        self._flights: Dict[str, _Flight] = {}
+        self.stats = {"requests": 0, "calls": 0, "coalesced": 0, "timeouts": 0, "failures": 0}
+
+    async def generate(self, model: str, prompt: str, on_queue: Optional[QueueCallback] = None) -> str:
+        self.stats["requests"] += 1
+        key = request_key(model, prompt)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._run(flight, model, prompt))
+            flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"Joining in-flight LLM request {key[:12]}")
+        if on_queue:
+            flight.listeners.append(on_queue)
+            if flight.position:
+                await self._notify(on_queue, flight.position)
+        # One caller giving up must not cancel the call the others are waiting on
+        return await asyncio.shield(flight.task)
+
+    def queue_length(self) -> int:
+        return len(self._waiting)
+
+    async def _run(self, flight: _Flight, model: str, prompt: str) -> str:
+        await self._acquire(flight)
+        try:
+            async with self.slots.hold(self.queue_timeout) if self.slots else nullcontext():
+                if flight.position == 0:
+                    await self._broadcast(flight, 0)
+                self.stats["calls"] += 1
+                try:
+                    return await asyncio.wait_for(self.call(model, prompt), self.call_timeout)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"LLM call to {model} timed out after {self.call_timeout:g}s")
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            raise
+        finally:
+            self._release()
+
+    async def _acquire(self, flight: _Flight) -> None:
+        if self._active < self.max_concurrency and not self._waiting:
+            self._active += 1
+            return
+        turn = asyncio.get_running_loop().create_future()
+        entry = (turn, flight)
+        self._waiting.append(entry)
+        await self._announce_positions()
+        try:
+            # The slot is handed over by _release, which also counts it as active
+            await asyncio.wait_for(asyncio.shield(turn), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not turn.done():
+                self._waiting.remove(entry)
+                self.stats["timeouts"] += 1
+                await self._announce_positions()
+                raise TimeoutError(f"Waited more than {self.queue_timeout:g}s for an LLM slot")
+        except asyncio.CancelledError:
+            if turn.done():
+                self._release()
+            else:
+                self._waiting.remove(entry)
+            raise
+        flight.position = 0
+
+    def _release(self) -> None:
+        self._active -= 1
+        while self._waiting and self._active < self.max_concurrency:
+            turn, _ = self._waiting.popleft()
+            if not turn.done():
+                self._active += 1
+                turn.set_result(None)
+        if self._waiting:
+            asyncio.get_running_loop().create_task(self._announce_positions())
+
+    async def _announce_positions(self) -> None:
+        for position, (_, flight) in enumerate(list(self._waiting), start=1):
+            if flight.position != position:
+                flight.position = position
+                await self._broadcast(flight, position)
+
+    async def _broadcast(self, flight: _Flight, position: int) -> None:
+        for listener in list(flight.listeners):
+            await self._notify(listener, position)
+
+    @staticmethod
+    async def _notify(listener: QueueCallback, position: int) -> None:
+        try:
+            await listener(position)
+        except Exception as e:
+            logger.warning(f"Queue position callback failed: {e}")
+
+
+broker = LLMBroker(slots=AdvisorySlots(LLM_GLOBAL_MAX_CONCURRENCY) if LLM_GLOBAL_MAX_CONCURRENCY > 0 else None)
@@ -0,0 +1,116 @@
+"""Local stand-in for the Gemini API, for running and load-testing mapping offline.
+
+    python -m app.services.ai_mapping.llm_stub_server --port 8765 --delay 2
+    GEMINI_API_KEY=stub LLM_BASE_URL=http://127.0.0.1:8765 python -m app.worker
+
+Answers generateContent requests with a mapping built from the header names in
+the prompt (or with a fixed JSON reply from --response), after --delay seconds.
+GET /stats reports how many requests arrived and the most that ran at once,
+which is what the broker's coalescing and concurrency cap should keep low.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+import argparse
+import json
+import re
+import threading
+import time
+from app.services.ai_mapping.heuristic_mapping import IMAGE_FIELD_HINTS, PRODUCT_FIELD_HINTS, _name_score, _normalize
+
+MIN_STUB_NAME_SCORE = 0.8
+# Column lines of the prompt's profile block: - "Header" | ...
+HEADER_RE = re.compile(r'^- ("(?:[^"\\]|\\.)*")', re.MULTILINE)
+
+
+def _prompt_headers(prompt: str) -> List[str]:
+    headers: List[str] = []
+    for match in HEADER_RE.finditer(prompt):
+        header = json.loads(match.group(1))
+        if header not in headers:
+            headers.append(header)
+    return headers
+
+
+def stub_mapping(prompt: str) -> Dict[str, Optional[str]]:
+    """Name-only mapping of the prompt's headers, one column per field"""
+    hints = IMAGE_FIELD_HINTS if "TARGET DATABASE MODELS" in prompt else PRODUCT_FIELD_HINTS
+    headers = _prompt_headers(prompt)
+    candidates = sorted(
+        ((_name_score(_normalize(header), synonyms), field, header)
+         for field, (synonyms, _) in hints.items() for header in headers),
+        reverse=True,
+    )
+    mapping: Dict[str, Optional[str]] = {field: None for field in hints}
+    used = set()
+    for score, field, header in candidates:
+        if score >= MIN_STUB_NAME_SCORE and mapping[field] is None and header not in used:
+            mapping[field] = header
+            used.add(header)
+    return mapping
+
+
+class StubState:
+    def __init__(self, delay: float, response: Optional[str]):
+        self.delay = delay
+        self.response = response
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/stats":
+                return self._send(404, {"error": "not found"})
+            self._send(200, {"requests": state.requests, "active": state.active, "max_active": state.max_active})
+
+        def do_POST(self):
+            if not self.path.split("?")[0].endswith(":generateContent"):
+                return self._send(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "".join(part.get("text", "") for content in request.get("contents", [])
+                             for part in content.get("parts", []))
+            with state.lock:
+                state.requests += 1
+                state.active += 1
+                state.max_active = max(state.max_active, state.active)
+            try:
+                time.sleep(state.delay)
+                text = state.response or json.dumps(stub_mapping(prompt))
+            finally:
+                with state.lock:
+                    state.active -= 1
+            self._send(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                                             "finishReason": "STOP"}]})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Gemini API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds to wait before answering")
+    parser.add_argument("--response", help="file whose contents are returned for every prompt")
+    args = parser.parse_args()
+    response = open(args.response).read() if args.response else None
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubState(args.delay, response)))
+    print(f"LLM stub listening on http://{args.host}:{args.port} (set LLM_BASE_URL to use it)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
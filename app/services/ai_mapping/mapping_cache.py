@@ -0,0 +1,220 @@
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import pandas as pd
+from cachetools import LRUCache
+from sqlalchemy import Table, bindparam, delete, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import AsyncSessionLocal
+from app.models.mapping_cache import ColumnMappingCache
+from app.models.product import Product
+from app.models.product_image import ProductImage
+from app.utils.sample_data import SheetData
+
+logger = logging.getLogger(__name__)
+
+MAPPING_CACHE_SIZE = int(os.getenv("MAPPING_CACHE_SIZE", "512"))
+# How long an LRU entry is trusted before its row is checked again; an
+# invalidation reaches other processes within this many seconds
+MAPPING_CACHE_RECHECK_SECONDS = float(os.getenv("MAPPING_CACHE_RECHECK_SECONDS", "30"))
+TYPE_INFERENCE_ROWS = 200
+
+MAPPING_TABLES: Dict[str, Table] = {
+    "column": Product.__table__,
+    "image": ProductImage.__table__,
+}
+
+# (kind, signature, schema version) -> (cache row id, normalized mapping, monotonic
+# time the row was last seen). Each process has its own LRU (see _recheck)
+_lru: LRUCache = LRUCache(maxsize=MAPPING_CACHE_SIZE)
+# cache row id -> (hits not yet written to the row, time of the latest one)
+_pending_hits: Dict[int, Tuple[int, datetime]] = {}
+
+
+def normalize_header(header: Any) -> str:
+    return re.sub(r'[\s_\-]+', ' ', str(header)).strip().lower()
+
+
+def _column_type(values: pd.Series) -> str:
+    values = values[values.notna() & (values.astype(str).str.strip() != "")]
+    if values.empty:
+        return "empty"
+    return pd.api.types.infer_dtype(values, skipna=True)
+
+
+def sheet_signature(sheets_data: List[SheetData]) -> str:
+    """Digest of every sheet's normalized header set and inferred column types"""
+    sheets = []
+    for _, columns, frames in sheets_data:
+        sample = frames.head(TYPE_INFERENCE_ROWS)
+        sheets.append(sorted(
+            (normalize_header(col), _column_type(sample[col]) if col in sample.columns else "empty")
+            for col in columns
+        ))
+    payload = json.dumps(sorted(sheets), separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def schema_version(table: Table) -> str:
+    """Changes whenever a column of the target table is added, dropped or retyped"""
+    payload = ",".join(f"{col.name}:{col.type}" for col in table.columns)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _to_normalized(mapping: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    return {field: normalize_header(col) if col else None for field, col in mapping.items()}
+
+
+def _resolve(mapping: Dict[str, Optional[str]], sheets_data: List[SheetData]) -> Dict[str, Optional[str]]:
+    # Cached entries hold normalized headers; map them back onto this upload's spelling
+    headers = {normalize_header(col): col for _, columns, _ in sheets_data for col in columns}
+    return {field: headers.get(col) if col else None for field, col in mapping.items()}
+
+
+def _record_hit(entry_id: int) -> None:
+    hits, _ = _pending_hits.get(entry_id, (0, None))
+    _pending_hits[entry_id] = (hits + 1, datetime.now(timezone.utc))
+
+
+async def _flush_hits(session: AsyncSession) -> None:
+    """Write the hits gathered since the last flush, one batched statement for every row"""
+    if not _pending_hits:
+        return
+    params = [{"entry_id": entry_id, "hits": hits, "used_at": used_at}
+              for entry_id, (hits, used_at) in _pending_hits.items()]
+    _pending_hits.clear()
+    table = ColumnMappingCache.__table__
+    await session.execute(
+        table.update()
+        .where(table.c.id == bindparam("entry_id"))
+        .values(hit_count=table.c.hit_count + bindparam("hits"), last_used_at=bindparam("used_at")),
+        params,
+    )
+
+
+async def _load(kind: str, signature: str, version: str) -> Optional[Tuple[int, Dict[str, Optional[str]]]]:
+    async with AsyncSessionLocal() as session:
+        entry = (await session.execute(
+            select(ColumnMappingCache).where(
+                ColumnMappingCache.kind == kind,
+                ColumnMappingCache.signature == signature,
+                ColumnMappingCache.schema_version == version,
+            )
+        )).scalar_one_or_none()
+        if entry is not None:
+            _record_hit(entry.id)
+        await _flush_hits(session)
+        await session.commit()
+        return (entry.id, entry.mapping) if entry is not None else None
+
+
+async def _recheck(entry_id: int) -> bool:
+    """Whether a cached row still exists; pending hit counts are written on the same trip.
+
+    Invalidation deletes rows from whichever process handles it, so this is how
+    an LRU entry in another process (e.g. a worker) learns it is stale.
+    """
+    async with AsyncSessionLocal() as session:
+        await _flush_hits(session)
+        found = (await session.execute(
+            select(ColumnMappingCache.id).where(ColumnMappingCache.id == entry_id)
+        )).scalar_one_or_none()
+        await session.commit()
+        return found is not None
+
+
+async def _store(kind: str, signature: str, version: str, mapping: Dict[str, Optional[str]]) -> int:
+    stmt = pg_insert(ColumnMappingCache).values(
+        kind=kind, signature=signature, schema_version=version, mapping=mapping
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["kind", "signature", "schema_version"],
+        set_={"mapping": stmt.excluded.mapping, "last_used_at": datetime.now(timezone.utc)},
+    ).returning(ColumnMappingCache.id)
+    async with AsyncSessionLocal() as session:
+        entry_id = (await session.execute(stmt)).scalar_one()
+        await _flush_hits(session)
+        await session.commit()
+        return entry_id
+
+
+async def cached_mapping(
+    kind: str,
+    sheets_data: List[SheetData],
+    generate: Callable[[], Awaitable[Dict[str, Optional[str]]]],
+    signature: Optional[str] = None,
+) -> Dict[str, Optional[str]]:
+    """Return the mapping for these sheets from the LRU, then the table, else `generate()`.
+
+    An LRU hit needs no database trip. Its row is checked for invalidation
+    only once MAPPING_CACHE_RECHECK_SECONDS have passed, and hit counts are
+    written in batches whenever the cache goes to the database anyway.
+    """
+    signature = signature or sheet_signature(sheets_data)
+    version = schema_version(MAPPING_TABLES[kind])
+    key = (kind, signature, version)
+
+    normalized = None
+    cached = _lru.get(key)
+    if cached is not None:
+        entry_id, normalized, checked_at = cached
+        if time.monotonic() - checked_at >= MAPPING_CACHE_RECHECK_SECONDS:
+            try:
+                if await _recheck(entry_id):
+                    _lru[key] = (entry_id, normalized, time.monotonic())
+                else:
+                    _lru.pop(key, None)
+                    normalized = None
+            except Exception as e:
+                # Without the database the cached mapping is the best answer available
+                logger.warning(f"Mapping cache check failed: {e}")
+        if normalized is not None:
+            _record_hit(entry_id)
+    if normalized is None:
+        try:
+            loaded = await _load(kind, signature, version)
+        except Exception as e:
+            logger.warning(f"Mapping cache lookup failed: {e}")
+            loaded = None
+        if loaded is not None:
+            _lru[key] = (*loaded, time.monotonic())
+            normalized = loaded[1]
+    if normalized is not None:
+        logger.info(f"Mapping cache hit for {kind} mapping {signature[:12]}")
+        return _resolve(normalized, sheets_data)
+
+    mapping = await generate()
+    normalized = _to_normalized(mapping)
+    try:
+        _lru[key] = (await _store(kind, signature, version, normalized), normalized, time.monotonic())
+    except Exception as e:
+        logger.warning(f"Could not persist {kind} mapping: {e}")
+    return mapping
+
+
+async def invalidate_mapping_cache(kind: Optional[str] = None, stale_only: bool = False) -> int:
+    """Drop cached mappings: all, one kind, or only those built for an older schema"""
+    kinds = [kind] if kind else list(MAPPING_TABLES)
+    if stale_only:
+        condition = or_(*[
+            (ColumnMappingCache.kind == name) & (ColumnMappingCache.schema_version != schema_version(MAPPING_TABLES[name]))
+            for name in kinds
+        ])
+    else:
+        condition = ColumnMappingCache.kind.in_(kinds)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(delete(ColumnMappingCache).where(condition))
+        await session.commit()
+
+    if not stale_only:
+        for key in [key for key in _lru.keys() if key[0] in kinds]:
+            _lru.pop(key, None)
+    logger.info(f"Invalidated {result.rowcount} cached mappings")
+    return result.rowcount
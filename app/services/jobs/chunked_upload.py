@@ -0,0 +1,231 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import uuid
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.metrics import file_format, track_stage
+from app.models.upload_session import UploadSession
+from app.services.jobs.ingestion_queue import STAGING_CHUNK_SIZE, UPLOAD_STAGING_DIR
+from app.utils.sample_data import SUPPORTED_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 ** 3)))  # 10GB
+UPLOAD_SESSION_TTL = timedelta(hours=int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")))
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def _offset_headers(session: UploadSession) -> Dict[str, str]:
+    return {"Upload-Offset": str(session.received_bytes)}
+
+
+async def create_upload_session(db: AsyncSession, supplier_id: int, filename: str, size: int,
+                                sha256: Optional[str] = None) -> UploadSession:
+    suffix = Path(filename).suffix.lower()
+    if suffix not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file format.")
+    if size <= 0 or size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail=f"File size must be between 1 and {MAX_UPLOAD_SIZE} bytes.")
+
+    await purge_stale_upload_sessions(db, supplier_id)
+
+    upload_id = uuid.uuid4().hex
+    UPLOAD_STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    path = UPLOAD_STAGING_DIR / f"{upload_id}{suffix}"
+    path.touch()
+    session = UploadSession(
+        id=upload_id, supplier_id=supplier_id, filename=filename, path=str(path),
+        total_size=size, received_bytes=0, sha256=sha256.lower() if sha256 else None, status="open"
+    )
+    db.add(session)
+    await db.commit()
+    logger.info(f"Opened upload session {upload_id} for {filename} ({size} bytes)")
+    return session
+
+
+async def get_upload_session(db: AsyncSession, upload_id: str, supplier_id: int,
+                             for_update: bool = False) -> UploadSession:
+    stmt = select(UploadSession).where(UploadSession.id == upload_id, UploadSession.supplier_id == supplier_id)
+    if for_update:
+        # Serializes aborts of the same session; finalize takes the lock itself once the file is hashed
+        stmt = stmt.with_for_update()
+    session = (await db.execute(stmt)).scalar_one_or_none()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+def parse_content_range(header: Optional[str], total_size: int) -> Tuple[int, int]:
+    """Parse 'bytes start-end/total' into an inclusive (start, end) byte range"""
+    match = CONTENT_RANGE_RE.match((header or "").strip())
+    if not match:
+        raise HTTPException(status_code=400, detail="Content-Range header must look like 'bytes start-end/total'.")
+    start, end, total = (int(part) for part in match.groups())
+    if total != total_size or start > end or end >= total_size:
+        raise HTTPException(status_code=416, detail=f"Invalid range {start}-{end}/{total} for a {total_size} byte upload.")
+    return start, end
+
+
+async def write_chunk(db: AsyncSession, session: UploadSession, start: int, end: int,
+                      chunk_sha256: Optional[str], body: AsyncIterator[bytes]) -> UploadSession:
+    """Append one byte range to the staged file after checking it continues the upload.
+
+    The range must start exactly at the bytes received so far. It is streamed to
+    a part file off the event loop, with no row lock or pooled connection held,
+    and only counted once its length and SHA-256 match. The offset then advances
+    with a conditional update, so of two PUTs racing for the same range only one
+    is appended; the other gets a 409 with the new offset.
+    """
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session.status}.")
+    if not chunk_sha256:
+        raise HTTPException(status_code=400, detail="X-Chunk-SHA256 header is required.")
+    if start != session.received_bytes:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Expected a chunk starting at byte {session.received_bytes}.",
+            headers=_offset_headers(session),
+        )
+    # Ends the read transaction so the connection goes back to the pool while the body streams in
+    await db.commit()
+
+    expected_length = end - start + 1
+    digest = hashlib.sha256()
+    written = 0
+    part_path = f"{session.path}.{uuid.uuid4().hex}.part"
+    try:
+        with track_stage("spool", file_format([session.filename])) as record, open(part_path, "wb") as out:
+            pending = bytearray()
+            async for data in body:
+                written += len(data)
+                if written > expected_length:
+                    break
+                digest.update(data)
+                pending += data
+                if len(pending) >= STAGING_CHUNK_SIZE:
+                    await asyncio.to_thread(out.write, pending)
+                    pending = bytearray()
+            if pending:
+                await asyncio.to_thread(out.write, pending)
+            record["bytes"] = written
+        if written != expected_length or digest.hexdigest() != chunk_sha256.strip().lower():
+            raise HTTPException(
+                status_code=422,
+                detail="Chunk length or checksum does not match; resend it.",
+                headers=_offset_headers(session),
+            )
+
+        advanced = await db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == session.id, UploadSession.status == "open",
+                   UploadSession.received_bytes == start)
+            .values(received_bytes=end + 1, updated_at=datetime.now(timezone.utc))
+        )
+        if advanced.rowcount != 1:
+            await db.rollback()
+            await db.refresh(session)
+            raise HTTPException(
+                status_code=409,
+                detail="The upload moved on while this chunk was sent; continue from the current offset.",
+                headers=_offset_headers(session),
+            )
+        # The update keeps the row locked until the commit, so only this request writes the range
+        await asyncio.to_thread(_append_part, session.path, part_path, start)
+        await db.commit()
+    finally:
+        _remove_file(part_path)
+    return session
+
+
+def _append_part(path: str, part_path: str, start: int) -> None:
+    with open(part_path, "rb") as part, open(path, "r+b") as out:
+        out.truncate(start)
+        out.seek(start)
+        shutil.copyfileobj(part, out, STAGING_CHUNK_SIZE)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(STAGING_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_complete(session: UploadSession) -> None:
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session.status}.")
+    if session.received_bytes != session.total_size:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {session.received_bytes} of {session.total_size} bytes received.",
+            headers=_offset_headers(session),
+        )
+
+
+async def finalize_upload_session(db: AsyncSession, session: UploadSession) -> Dict[str, str]:
+    """Verify the assembled file and return it as a staged file for the ingestion queue.
+
+    The file is hashed with no row lock or pooled connection held. The session
+    is then locked and checked again, so a finalize or abort that got there
+    first wins; the lock is held until the caller closes the session.
+    """
+    _check_complete(session)
+    # Ends the read transaction so the connection goes back to the pool while the file is hashed
+    await db.commit()
+
+    try:
+        digest = await asyncio.to_thread(_file_sha256, session.path)
+    except FileNotFoundError:
+        digest = None  # removed by an abort, which the re-check below reports
+    await db.refresh(session, with_for_update=True)
+    _check_complete(session)
+    if digest is None or (session.sha256 and digest != session.sha256):
+        session.status = "failed"
+        await db.commit()
+        _remove_file(session.path)
+        raise HTTPException(status_code=422, detail="Assembled file does not match the declared SHA-256.")
+
+    # The staged file is handed over as-is; the worker deletes it when done
+    return {"path": session.path, "filename": session.filename, "sha256": digest}
+
+
+async def close_upload_session(db: AsyncSession, session: UploadSession, status: str, job_id: Optional[int] = None) -> None:
+    session.status = status
+    session.job_id = job_id
+    session.updated_at = datetime.now(timezone.utc)
+    await db.commit()
+    if status == "aborted":
+        _remove_file(session.path)
+
+
+async def purge_stale_upload_sessions(db: AsyncSession, supplier_id: int) -> None:
+    """Drop this supplier's open sessions that have not received data within the TTL"""
+    cutoff = datetime.now(timezone.utc) - UPLOAD_SESSION_TTL
+    stale = (await db.execute(
+        select(UploadSession).where(
+            UploadSession.supplier_id == supplier_id,
+            UploadSession.status == "open",
+            UploadSession.updated_at < cutoff,
+        )
+    )).scalars().all()
+    for session in stale:
+        session.status = "expired"
+        _remove_file(session.path)
+    if stale:
+        logger.info(f"Expired {len(stale)} stale upload sessions for supplier {supplier_id}")
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
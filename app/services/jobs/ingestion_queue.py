@@ -0,0 +1,299 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import hashlib
+import logging
+import os
+import uuid
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import and_, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import JOBS, file_format, track_stage
+from app.models.ingestion_job import IngestionJob
+from app.models.supplier_details import UploadLog
+from app.utils.sample_data import SUPPORTED_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Must be shared storage (e.g. a mounted volume) when workers run on other nodes
+UPLOAD_STAGING_DIR = Path(os.getenv("UPLOAD_STAGING_DIR", "uploads"))
+STAGING_CHUNK_SIZE = 1024 * 1024  # 1MB
+STALE_JOB_AFTER = timedelta(seconds=int(os.getenv("INGESTION_STALE_JOB_SECONDS", "300")))
+MAX_JOB_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+# Transaction advisory lock (UPLOAD_DEDUP_LOCK_CLASS, supplier id) serialises a supplier's duplicate checks
+UPLOAD_DEDUP_LOCK_CLASS = 0x55504C
+
+
+async def stage_uploads(files: List[UploadFile]) -> List[Dict[str, str]]:
+    """Write uploads to the staging directory so a worker can pick them up.
+
+    Each file is SHA-256 fingerprinted while it is spooled, so identical
+    re-uploads can be recognised without reading them a second time.
+    Unsupported file types are refused before anything is written.
+    """
+    for file in files:
+        if Path(file.filename or "").suffix.lower() not in SUPPORTED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Unsupported file format: {file.filename}")
+    UPLOAD_STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    staged = []
+    for file in files:
+        path = UPLOAD_STAGING_DIR / f"{uuid.uuid4().hex}{Path(file.filename).suffix.lower()}"
+        digest = hashlib.sha256()
+        with track_stage("spool", file_format([file.filename])) as record, open(path, "wb") as out:
+            while chunk := await file.read(STAGING_CHUNK_SIZE):
+                digest.update(chunk)
+                out.write(chunk)
+                record["bytes"] = record.get("bytes", 0) + len(chunk)
+        staged.append({"path": str(path), "filename": file.filename, "sha256": digest.hexdigest()})
+    return staged
+
+
+def upload_digest(files: List[Dict[str, str]]) -> Optional[str]:
+    """Fingerprint of a whole upload: independent of file order and file names"""
+    digests = sorted(staged.get("sha256") or "" for staged in files)
+    if not digests or not all(digests):
+        return None
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256("".join(digests).encode()).hexdigest()
+
+
+def remove_staged_files(files: List[Dict[str, str]]) -> None:
+    for staged in files:
+        try:
+            os.remove(staged["path"])
+        except FileNotFoundError:
+            pass
+
+
+async def enqueue_job(db: AsyncSession, supplier_id: int, files: List[Dict[str, str]], dry_run: bool = False) -> IngestionJob:
+    job = IngestionJob(supplier_id=supplier_id, status="queued", stage="queued", files=files, dry_run=dry_run)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    logger.info(f"Queued {'dry-run ' if dry_run else ''}ingestion job {job.id} for supplier {supplier_id}")
+    return job
+
+
+async def find_ingested_upload(db: AsyncSession, supplier_id: int, content_hash: Optional[str]) -> Optional[UploadLog]:
+    """Latest successful ingestion of a byte-identical upload by this supplier"""
+    if not content_hash:
+        return None
+    result = await db.execute(
+        select(UploadLog)
+        .where(
+            UploadLog.supplier_id == supplier_id,
+            UploadLog.content_hash == content_hash,
+            UploadLog.status == "success",
+            UploadLog.result.isnot(None),
+        )
+        .order_by(UploadLog.timestamp.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def find_active_upload(db: AsyncSession, supplier_id: int, content_hash: Optional[str]) -> Optional[IngestionJob]:
+    """Oldest queued or running ingestion of a byte-identical upload by this supplier"""
+    if not content_hash:
+        return None
+    result = await db.execute(
+        select(IngestionJob)
+        .where(
+            IngestionJob.supplier_id == supplier_id,
+            IngestionJob.status.in_(("queued", "running")),
+            IngestionJob.dry_run.is_(False),
+        )
+        .order_by(IngestionJob.created_at)
+    )
+    return next((job for job in result.scalars() if upload_digest(job.files) == content_hash), None)
+
+
+async def find_duplicate_upload(db: AsyncSession, supplier_id: int, content_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Response for an upload this supplier already ingested or has in the queue, or None.
+
+    Takes a transaction lock per supplier first, so an identical upload
+    arriving at the same time waits until this one is enqueued (the commit
+    releases the lock) and then finds its job.
+    """
+    if not content_hash:
+        return None
+    await db.execute(text("SELECT pg_advisory_xact_lock(:lock_class, :supplier_id)"),
+                     {"lock_class": UPLOAD_DEDUP_LOCK_CLASS, "supplier_id": supplier_id})
+    active = await find_active_upload(db, supplier_id, content_hash)
+    if active:
+        logger.info(f"Identical upload already {active.status} (job {active.id}), returning that job")
+        return {"job_id": active.id, "status": active.status, "duplicate": True}
+    previous = await find_ingested_upload(db, supplier_id, content_hash)
+    if previous:
+        logger.info(f"Identical upload already ingested (job {previous.job_id}), returning previous result")
+        return {"job_id": previous.job_id, "status": "done", "duplicate": True, "result": previous.result}
+    return None
+
+
+async def record_upload(job: IngestionJob, status: str, message: str, result: Optional[Dict[str, Any]] = None) -> None:
+    """Write the supplier's upload log entry for a finished job"""
+    try:
+        async with AsyncSessionLocal() as session:
+            session.add(UploadLog(
+                supplier_id=job.supplier_id,
+                status=status,
+                message=message,
+                timestamp=datetime.now(timezone.utc).replace(tzinfo=None),
+                content_hash=upload_digest(job.files),
+                job_id=job.id,
+                result=result,
+            ))
+            await session.commit()
+    except Exception as e:
+        logger.warning(f"Could not record upload log for job {job.id}: {e}")
+
+
+async def get_job(db: AsyncSession, job_id: int, supplier_id: int) -> Optional[IngestionJob]:
+    result = await db.execute(
+        select(IngestionJob).where(IngestionJob.id == job_id, IngestionJob.supplier_id == supplier_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def fail_abandoned_jobs(db: AsyncSession) -> None:
+    """Fail running jobs whose worker stopped heartbeating on their last attempt, and drop their staged files"""
+    now = datetime.now(timezone.utc)
+    abandoned = (await db.execute(
+        select(IngestionJob)
+        .where(
+            IngestionJob.status == "running",
+            IngestionJob.heartbeat_at < now - STALE_JOB_AFTER,
+            IngestionJob.attempts >= MAX_JOB_ATTEMPTS,
+        )
+        .with_for_update(skip_locked=True)
+    )).scalars().all()
+    if not abandoned:
+        await db.rollback()
+        return
+    error = f"Worker stopped responding on attempt {MAX_JOB_ATTEMPTS} of {MAX_JOB_ATTEMPTS}"
+    for job in abandoned:
+        job.status = "failed"
+        job.stage = "failed"
+        job.error = error
+        job.queue_position = None
+        job.finished_at = now
+    await db.commit()
+    for job in abandoned:
+        logger.warning(f"Ingestion job {job.id} failed: {error}")
+        JOBS.labels("failed", file_format(file["filename"] for file in job.files)).inc()
+        remove_staged_files(job.files)
+        if not job.dry_run:
+            await record_upload(job, "error", error)
+
+
+async def claim_next_job(db: AsyncSession, worker_id: str) -> Optional[IngestionJob]:
+    """Claim the oldest queued job (or one whose worker stopped heartbeating).
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never block on
+    or double-claim the same row. Stale jobs without attempts left are failed
+    first, so they do not stay running forever.
+    """
+    await fail_abandoned_jobs(db)
+    now = datetime.now(timezone.utc)
+    stmt = (
+        select(IngestionJob)
+        .where(
+            or_(
+                IngestionJob.status == "queued",
+                and_(IngestionJob.status == "running", IngestionJob.heartbeat_at < now - STALE_JOB_AFTER),
+            ),
+            IngestionJob.attempts < MAX_JOB_ATTEMPTS,
+        )
+        .order_by(IngestionJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = (await db.execute(stmt)).scalar_one_or_none()
+    if not job:
+        await db.rollback()
+        return None
+
+    job.status = "running"
+    job.stage = "claimed"
+    job.worker_id = worker_id
+    job.attempts += 1
+    job.started_at = now
+    job.heartbeat_at = now
+    await db.commit()
+    logger.info(f"Worker {worker_id} claimed ingestion job {job.id} (attempt {job.attempts})")
+    return job
+
+
+async def _update_job(job_id: int, **values: Any) -> None:
+    # Progress is written from a separate session so it commits independently
+    # of the ingestion transaction.
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id)
+            .values(heartbeat_at=datetime.now(timezone.utc), **values)
+        )
+        await session.commit()
+
+
+async def heartbeat_job(job_id: int) -> None:
+    await _update_job(job_id)
+
+
+async def update_job_progress(job_id: int, stage: str, progress: int, rows_processed: Optional[int] = None) -> None:
+    values = {"stage": stage, "progress": progress, "queue_position": None}
+    if rows_processed is not None:
+        values["rows_processed"] = rows_processed
+    await _update_job(job_id, **values)
+
+
+async def update_job_queue_position(job_id: int, position: int) -> None:
+    """Place of the job's mapping request in the LLM queue (0 once its call is running)"""
+    await _update_job(job_id, stage="mapping_queued" if position else "mapping", queue_position=position or None)
+
+
+async def save_job_checkpoint(db: AsyncSession, job_id: int, checkpoint: Dict[str, Any]) -> None:
+    """Record a checkpoint in the ingestion session's own transaction, so it commits with the rows it covers"""
+    await db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id)
+        .values(checkpoint=checkpoint, heartbeat_at=datetime.now(timezone.utc))
+    )
+
+
+async def complete_job(job_id: int, result: Dict[str, Any]) -> None:
+    await _update_job(
+        job_id, status="done", stage="done", progress=100, result=result,
+        error=None, queue_position=None, finished_at=datetime.now(timezone.utc)
+    )
+
+
+async def fail_job(job_id: int, error: str) -> None:
+    await _update_job(job_id, status="failed", stage="failed", error=error, queue_position=None,
+                      finished_at=datetime.now(timezone.utc))
+
+
+async def retry_or_fail_job(job_id: int, error: str) -> bool:
+    """Requeue a failed job that has a checkpoint to resume from and attempts left; otherwise fail it.
+
+    Returns True when the job was requeued.
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(IngestionJob)
+            .where(
+                IngestionJob.id == job_id,
+                IngestionJob.checkpoint.isnot(None),
+                IngestionJob.attempts < MAX_JOB_ATTEMPTS,
+            )
+            .values(status="queued", stage="queued", error=error, queue_position=None, worker_id=None,
+                    heartbeat_at=datetime.now(timezone.utc))
+        )
+        await session.commit()
+    if result.rowcount:
+        logger.info(f"Requeued ingestion job {job_id} to resume from its checkpoint")
+        return True
+    await fail_job(job_id, error)
+    return False
@@ -0,0 +1,105 @@
+from datetime import date, datetime
+from typing import Callable, Dict, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import Table
+
+# Converts one raw column to database values (None for empty cells) and flags the
+# cells that held something but could not be converted.
+Converter = Callable[[pd.Series], Tuple[pd.Series, pd.Series]]
+
+NULL_TEXT = {"", "null"}
+NULL_TEXT_VARIANTS = {"", "null", "NULL", "Null"}
+TRUE_TEXT = {"yes", "true", "1", "1.0", "y"}
+FALSE_TEXT = {"no", "false", "0", "0.0", "n"}
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%Y%m%d", "%Y-%m-%d %H:%M:%S")
+EXCEL_EPOCH = pd.Timestamp(1899, 12, 30)
+MAX_EXCEL_SERIAL = 2958465  # 9999-12-31
+MIN_YEAR = 1900
+MAX_INTEGER = 2 ** 63
+
+
+def _empty(values: pd.Series) -> pd.Series:
+    return values.isna() | values.astype(str).str.strip().str.lower().isin(NULL_TEXT)
+
+
+def _finish(converted: pd.Series, values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Database values plus the failure mask; only cells that did not convert are checked for emptiness"""
+    converted = converted.astype(object)
+    invalid = converted.isna()
+    failed = invalid.to_numpy().copy()
+    if failed.any():
+        failed[failed] = ~_empty(values[invalid]).to_numpy(dtype=bool)
+    return converted.where(~invalid, None), pd.Series(failed, index=values.index)
+
+
+def _numbers(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype(float)
+    # to_numeric parses in C and ignores surrounding whitespace
+    return pd.to_numeric(values, errors="coerce")
+
+
+def convert_float(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    return _finish(_numbers(values), values)
+
+
+def convert_integer(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    numbers = _numbers(values)
+    # Fractions are truncated; infinities and out-of-range values cannot be stored
+    numbers = np.trunc(numbers.where(np.isfinite(numbers) & (numbers.abs() < MAX_INTEGER)))
+    return _finish(numbers.astype("Int64"), values)
+
+
+def convert_boolean(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    text = values.astype(str).str.strip().str.lower()
+    converted = pd.Series(None, index=values.index, dtype=object)
+    converted[text.isin(TRUE_TEXT)] = True
+    converted[text.isin(FALSE_TEXT)] = False
+    return _finish(converted, values)
+
+
+def convert_datetime(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Dates as parsed datetimes, Excel serial day numbers, or text in one of DATE_FORMATS"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        parsed = values
+    else:
+        text = values.astype(str).str.strip()
+        serials = pd.to_numeric(text.where(text.str.fullmatch(r"\d+(\.0+)?")), errors="coerce")
+        serials = serials.where(serials <= MAX_EXCEL_SERIAL)
+        parsed = EXCEL_EPOCH + pd.to_timedelta(serials, unit="D")
+        for fmt in DATE_FORMATS:
+            todo = parsed.isna()
+            if not todo.any():
+                break
+            parsed = parsed.fillna(pd.to_datetime(text.where(todo), format=fmt, errors="coerce"))
+    return _finish(parsed.where(parsed.dt.year >= MIN_YEAR), values)
+
+
+def convert_text(values: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    text = values.astype(str).str.strip()
+    empty = values.isna() | text.isin(NULL_TEXT_VARIANTS)
+    return text.astype(object).where(~empty, None), pd.Series(False, index=values.index)
+
+
+CONVERTERS: Dict[type, Converter] = {
+    bool: convert_boolean,
+    int: convert_integer,
+    float: convert_float,
+    datetime: convert_datetime,
+    date: convert_datetime,
+}
+
+
+def converter_for(table: Table, db_col: str) -> Converter:
+    """Pick the converter from the column's SQLAlchemy type"""
+    try:
+        python_type = table.c[db_col].type.python_type
+    except (KeyError, NotImplementedError):
+        return convert_text
+    return CONVERTERS.get(python_type, convert_text)
+
+
+def compile_converters(table: Table, column_map: Dict[str, str]) -> Dict[str, Converter]:
+    """Converter for each sheet column of a {sheet column: db column} map, resolved once per sheet"""
+    return {col: converter_for(table, db_col) for col, db_col in column_map.items()}
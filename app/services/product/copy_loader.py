@@ -0,0 +1,95 @@
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import Boolean, Table, column, func, literal_column, select, table, text
+from sqlalchemy.dialects.postgresql import Insert, insert as pg_insert
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def changed_rows_only(insert_stmt: Insert, target: Table, update_dict: Dict[str, Any], conflict_keys: List[str],
+                      hash_column: Optional[str] = None) -> Insert:
+    """ON CONFLICT DO UPDATE that leaves rows alone when their content hash is unchanged"""
+    if not update_dict:
+        return insert_stmt.on_conflict_do_nothing(index_elements=conflict_keys)
+    where = None
+    if hash_column:
+        where = target.c[hash_column].is_distinct_from(insert_stmt.excluded[hash_column])
+    return insert_stmt.on_conflict_do_update(index_elements=conflict_keys, set_=update_dict, where=where)
+
+
+async def execute_counted_upsert(db, stmt: Insert) -> Tuple[int, int]:
+    """Run an upsert and return (inserted, updated); skipped conflicts count as neither"""
+    written = stmt.returning(literal_column("xmax = 0", Boolean).label("inserted")).cte("written")
+    counts = select(
+        func.count().filter(written.c.inserted),
+        func.count().filter(~written.c.inserted),
+    )
+    inserted, updated = (await db.execute(counts)).one()
+    return inserted, updated
+
+
+class CopyStagingLoader:
+    """Upsert loader that streams rows into a temp staging table with binary COPY
+    and merges them into the target table with one set-based statement.
+
+    Works on the connection behind the given AsyncSession, so staged rows are
+    merged inside the same transaction as the rest of the upload.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def _driver_connection(self):
+        conn = await self.db.connection()
+        raw = await conn.get_raw_connection()
+        return raw.driver_connection
+
+    async def _prepare_stage(self, target: Table) -> str:
+        stage_name = f"_stage_{target.name}"
+        await self.db.execute(text(
+            f'CREATE TEMP TABLE IF NOT EXISTS "{stage_name}" '
+            f'(LIKE "{target.name}" INCLUDING DEFAULTS) ON COMMIT DROP'
+        ))
+        return stage_name
+
+    async def upsert(self, target: Table, data: List[Dict[str, Any]], conflict_keys: List[str],
+                     preserve_existing: bool = False, hash_column: Optional[str] = None) -> Tuple[int, int]:
+        """COPY `data` into the staging table and merge it into `target`.
+
+        With `preserve_existing`, NULLs in the staged rows keep the value already
+        stored instead of overwriting it (rows may carry different column sets).
+        With `hash_column`, existing rows whose hash matches are not rewritten.
+        Returns the (inserted, updated) row counts.
+        """
+        if not data:
+            return 0, 0
+        present = set().union(*(row.keys() for row in data))
+        columns = [c.name for c in target.columns if c.name in present]
+        stage_name = await self._prepare_stage(target)
+
+        driver_conn = await self._driver_connection()
+        await driver_conn.copy_records_to_table(
+            stage_name,
+            records=[tuple(row.get(col) for col in columns) for row in data],
+            columns=columns,
+        )
+
+        stage = table(stage_name, *[column(col) for col in columns])
+        latest_rows = (
+            select(*[stage.c[col] for col in columns])
+            .distinct(*[stage.c[key] for key in conflict_keys])
+            .order_by(*[stage.c[key] for key in conflict_keys], literal_column("ctid").desc())
+        )
+        insert_stmt = pg_insert(target).from_select(columns, latest_rows)
+        update_cols = [col for col in columns if col not in conflict_keys]
+        if preserve_existing:
+            update_dict = {col: func.coalesce(getattr(insert_stmt.excluded, col), target.c[col])
+                           for col in update_cols if col != hash_column}
+            if hash_column in update_cols:
+                update_dict[hash_column] = insert_stmt.excluded[hash_column]
+        else:
+            update_dict = {col: getattr(insert_stmt.excluded, col) for col in update_cols}
+        stmt = changed_rows_only(insert_stmt, target, update_dict, conflict_keys, hash_column)
+        counts = await execute_counted_upsert(self.db, stmt)
+        await self.db.execute(text(f'TRUNCATE "{stage_name}"'))
+        return counts
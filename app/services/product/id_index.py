@@ -0,0 +1,269 @@
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from app.models.product import Product
+
+logger = logging.getLogger(__name__)
+
+JOIN_SAMPLE_ROWS = 500
+MIN_JOIN_HIT_RATIO = 0.2
+# Key arrays larger than this live in an anonymous memory-mapped temp file
+INDEX_SPILL_KEYS = int(os.getenv("PRODUCT_INDEX_SPILL_KEYS", "2000000"))
+# Keys a sorted run collects before it is folded into the base array
+INDEX_RUN_KEYS = 1 << 16
+# Keys moved at a time while merging into or compacting a spilled base
+INDEX_MERGE_CHUNK_KEYS = 1 << 20
+RESOLVE_BATCH_SIZE = 5000
+
+
+def canonical_keys(values: pd.Series) -> pd.Series:
+    """Vectorized canonical form of product IDs used for matching.
+
+    Whitespace is removed and case folded; purely numeric IDs lose a trailing
+    '.0' and leading zeros, so 'sku 01', 'SKU01', 123, 123.0 and '00123' match
+    their stored counterparts. Missing or blank values become None. Mirrors the
+    products.canonical_id column expression.
+    """
+    present = values.notna()
+    keys = values[present].astype(str).str.replace(r'\s+', '', regex=True).str.upper()
+    numeric = keys.str.fullmatch(r'[0-9]+(?:\.0*)?')
+    if numeric.any():
+        keys[numeric] = keys[numeric].str.replace(r'\.0*$', '', regex=True).str.lstrip('0').replace('', '0')
+    keys = keys.where(keys != '', None)
+    return keys.reindex(values.index).astype(object).where(lambda k: k.notna(), None)
+
+
+def key_hashes(keys: pd.Series) -> np.ndarray:
+    return pd.util.hash_array(keys.to_numpy(dtype=object))
+
+
+def _sorted_contains(sorted_hashes: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    if not len(sorted_hashes):
+        return np.zeros(len(hashes), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+    return sorted_hashes[positions] == hashes
+
+
+def _merge_in_place(buffer: np.ndarray, size: int, new: np.ndarray) -> None:
+    """Merge sorted `new`, disjoint from the sorted buffer[:size], into buffer[:size + len(new)].
+
+    Existing keys only move right, so they are moved back to front a chunk at
+    a time and never more than one chunk is held in memory.
+    """
+    new_positions = np.searchsorted(buffer[:size], new) + np.arange(len(new))
+    for end in range(size, 0, -INDEX_MERGE_CHUNK_KEYS):
+        start = max(0, end - INDEX_MERGE_CHUNK_KEYS)
+        chunk = np.array(buffer[start:end])
+        buffer[np.arange(start, end) + np.searchsorted(new, chunk)] = chunk
+    buffer[new_positions] = new
+
+
+class _HashSet:
+    """Set of 64-bit hashes as a sorted base array plus smaller sorted runs.
+
+    Added hashes become a run; runs of similar size are merged and folded into
+    the base once they reach a fraction of it, so each hash is copied a few
+    times in total rather than once per added batch. Past `spill_keys` the base
+    lives in one anonymous memory-mapped temp file that grows in place.
+    """
+
+    def __init__(self, spill_keys: int):
+        self.spill_keys = spill_keys
+        self._base = np.empty(0, dtype=np.uint64)
+        self._runs: List[np.ndarray] = []
+        self._file = None
+        self._map: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        return len(self._base) + sum(len(run) for run in self._runs)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        found = _sorted_contains(self._base, hashes)
+        for run in self._runs:
+            found |= _sorted_contains(run, hashes)
+        return found
+
+    def add(self, hashes: np.ndarray) -> None:
+        hashes = np.unique(hashes)
+        hashes = hashes[~self.contains(hashes)]
+        if not len(hashes):
+            return
+        self._runs.append(hashes)
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            newest = self._runs.pop()
+            self._runs[-1] = np.union1d(self._runs[-1], newest)
+        fold_at = max(INDEX_RUN_KEYS, min(len(self._base), self.spill_keys) // 4)
+        if sum(len(run) for run in self._runs) >= fold_at:
+            self._fold()
+
+    def discard(self, hashes: np.ndarray) -> None:
+        hashes = np.unique(hashes)
+        self._runs = [kept for run in self._runs if len(kept := run[~_sorted_contains(hashes, run)])]
+        if self._map is None:
+            self._base = self._base[~_sorted_contains(hashes, self._base)]
+            return
+        # Compacts front to back; the write position never passes the read position
+        size = 0
+        for start in range(0, len(self._base), INDEX_MERGE_CHUNK_KEYS):
+            chunk = np.array(self._base[start:start + INDEX_MERGE_CHUNK_KEYS])
+            chunk = chunk[~_sorted_contains(hashes, chunk)]
+            self._map[size:size + len(chunk)] = chunk
+            size += len(chunk)
+        self._base = self._map[:size]
+
+    def _fold(self) -> None:
+        runs = self._runs[0] if len(self._runs) == 1 else np.unique(np.concatenate(self._runs))
+        self._runs = []
+        size = len(self._base) + len(runs)
+        if self._map is None and size <= self.spill_keys:
+            self._base = np.union1d(self._base, runs)
+            return
+        self._reserve(size)
+        _merge_in_place(self._map, len(self._base), runs)
+        self._base = self._map[:size]
+
+    def _reserve(self, size: int) -> None:
+        if self._map is not None and len(self._map) >= size:
+            return
+        capacity = max(size, 2 * len(self._map) if self._map is not None else size + size // 2)
+        spilled = self._map is None
+        if spilled:
+            # Unlinked on creation and freed when the index is dropped
+            self._file = tempfile.TemporaryFile()
+        self._file.truncate(capacity * np.dtype(np.uint64).itemsize)
+        self._map = np.memmap(self._file, dtype=np.uint64, mode="r+", shape=(capacity,))
+        if spilled:
+            self._map[:len(self._base)] = self._base
+        self._base = self._map[:len(self._base)]
+
+
+class ProductIdIndex:
+    """Compact set of the supplier's product IDs, keyed by canonical form.
+
+    Keys are held as sorted 64-bit hashes, 8 bytes per product rather than
+    Python strings, and move to a memory-mapped file past INDEX_SPILL_KEYS.
+    A matched key is its own stored product ID unless the stored ID is written
+    differently (e.g. 'SKU 01' or '00123'); only those are kept as strings.
+
+    The index is filled with the IDs an upload writes and, on demand, with IDs
+    found by `resolve_product_ids`; keys already looked up and not found are
+    remembered so the database is asked about each key at most once.
+    """
+
+    def __init__(self, spill_keys: int = INDEX_SPILL_KEYS):
+        self.spill_keys = spill_keys
+        self._hashes = _HashSet(spill_keys)
+        self._checked = _HashSet(spill_keys)
+        self._aliases: Dict[str, str] = {}
+        # Cleaning threads read the index while lookups on other threads extend it
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_ids(cls, product_ids: Iterable[str]) -> "ProductIdIndex":
+        index = cls()
+        index.add(product_ids)
+        return index
+
+    def add(self, product_ids: Iterable[str]) -> None:
+        """Add stored product IDs"""
+        ids = product_ids if isinstance(product_ids, pd.Series) else pd.Series(list(product_ids), dtype=object)
+        if ids.empty:
+            return
+        keys = canonical_keys(ids)
+        present = keys.notna()
+        keys, ids = keys[present], ids[present].astype(str)
+        differs = (keys != ids).to_numpy()
+        hashes = key_hashes(keys)
+        with self._lock:
+            if differs.any():
+                self._aliases.update(zip(keys[differs], ids[differs]))
+            self._hashes.add(hashes)
+
+    def discard(self, product_ids: pd.Series) -> None:
+        """Forget product IDs whose write was rolled back; they are looked up again if referenced"""
+        hashes = key_hashes(canonical_keys(product_ids).dropna())
+        with self._lock:
+            self._hashes.discard(hashes)
+            self._checked.discard(hashes)
+
+    def mark_checked(self, keys: List[str]) -> None:
+        """Remember canonical keys that were looked up in the database"""
+        if keys:
+            hashes = key_hashes(pd.Series(keys, dtype=object))
+            with self._lock:
+                self._checked.add(hashes)
+
+    def unknown_keys(self, values: pd.Series) -> List[str]:
+        """Distinct canonical keys of `values` that are neither indexed nor already looked up"""
+        keys = canonical_keys(values).dropna().drop_duplicates()
+        if keys.empty:
+            return []
+        hashes = key_hashes(keys)
+        with self._lock:
+            known = self._hashes.contains(hashes) | self._checked.contains(hashes)
+        return keys[~known].tolist()
+
+    def lookup(self, values: pd.Series) -> pd.Series:
+        """Stored product ID for every value (None where there is no match)"""
+        keys = canonical_keys(values).dropna()
+        if keys.empty or not len(self):
+            return pd.Series(None, index=values.index, dtype=object)
+        hashes = key_hashes(keys)
+        with self._lock:
+            matched = keys[self._hashes.contains(hashes)]
+            if self._aliases:
+                matched = matched.map(self._aliases).fillna(matched)
+        return matched.reindex(values.index).astype(object).where(lambda m: m.notna(), None)
+
+    def hit_ratio(self, values: pd.Series) -> float:
+        keys = canonical_keys(values).dropna()
+        if keys.empty:
+            return 0.0
+        hashes = key_hashes(keys)
+        with self._lock:
+            return float(self._hashes.contains(hashes).mean())
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+async def resolve_product_ids(db, supplier_id: int, index: ProductIdIndex, values: pd.Series) -> int:
+    """Look up the canonical keys of `values` that the index does not know yet.
+
+    Uses the (supplier_id, canonical_id) index, so only the products referenced
+    by the sheet are read instead of the whole catalog. Returns the number found.
+    """
+    keys = await asyncio.to_thread(index.unknown_keys, values)
+    found = 0
+    for start in range(0, len(keys), RESOLVE_BATCH_SIZE):
+        batch = keys[start:start + RESOLVE_BATCH_SIZE]
+        result = await db.execute(
+            select(Product.product_id).where(Product.supplier_id == supplier_id, Product.canonical_id.in_(batch))
+        )
+        product_ids = result.scalars().all()
+        await asyncio.to_thread(index.add, product_ids)
+        found += len(product_ids)
+    await asyncio.to_thread(index.mark_checked, keys)
+    return found
+
+
+def detect_join_column(sample: pd.DataFrame, index: ProductIdIndex, exclude: Iterable[str] = (),
+                       preferred: Optional[str] = None) -> Optional[str]:
+    """Pick the column of a sheet sample whose values best match known product IDs"""
+    excluded = set(exclude)
+    candidates: List[str] = [col for col in sample.columns if col not in excluded]
+    best_col, best_ratio = None, 0.0
+    for col in candidates:
+        ratio = index.hit_ratio(sample[col])
+        if ratio > best_ratio or (ratio == best_ratio and ratio > 0 and col == preferred):
+            best_col, best_ratio = col, ratio
+    if best_ratio < MIN_JOIN_HIT_RATIO:
+        return None
+    logger.info(f"Detected product ID join column '{best_col}' ({best_ratio:.0%} of sampled values match)")
+    return best_col
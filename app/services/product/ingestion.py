@@ -0,0 +1,100 @@
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.metrics import file_format, track_stage
+from app.models.product import Product
+from app.services.ai_mapping.column_mapping import generate_column_mapping
+from app.services.ai_mapping.column_profiler import format_profiles, profile_sheets
+from app.services.ai_mapping.image_mapping import generate_image_mapping
+from app.services.ai_mapping.heuristic_mapping import resolve_mapping
+from app.services.ai_mapping.llm_broker import QueueCallback
+from app.services.ai_mapping.mapping_cache import sheet_signature
+from app.services.product.product_insertion import BulkInserter, CheckpointCallback
+from app.services.product.rejected_rows import RejectedRowsWriter
+from app.services.product.validation import UploadValidator
+from app.utils.model_fileds import get_model_fields
+from app.utils.sample_data import data_extraction
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[str, int, Optional[int]], Awaitable[None]]
+
+
+async def run_ingestion(
+    db: AsyncSession,
+    supplier_id: int,
+    files: List[Dict[str, str]],
+    on_progress: Optional[ProgressCallback] = None,
+    dry_run: bool = False,
+    rejects_path: Optional[Path] = None,
+    on_queue: Optional[QueueCallback] = None,
+    checkpoint: Optional[Dict[str, Any]] = None,
+    on_checkpoint: Optional[CheckpointCallback] = None,
+) -> Dict[str, Any]:
+    """Parse, map and bulk insert one upload; shared by the worker and tooling.
+
+    With `dry_run` the rows are only validated and nothing is written. Rows that
+    cannot be loaded are written to a CSV at `rejects_path` when one is given.
+    `on_queue` receives the upload's place in the LLM queue while mapping waits.
+    `checkpoint` is where an earlier, interrupted attempt got to: its mappings are
+    reused and loading continues after the rows it committed.
+    """
+    async def report(stage: str, progress: int, rows_processed: Optional[int] = None):
+        if on_progress:
+            await on_progress(stage, progress, rows_processed)
+
+    fmt = file_format(file["filename"] for file in files)
+    await report("parsing", 5)
+    with track_stage("extract", fmt):
+        sheets_data = await data_extraction(files)
+    if not sheets_data:
+        raise HTTPException(status_code=400, detail="No readable sheets found in the upload.")
+    await report("mapping", 20)
+    if checkpoint and not dry_run:
+        # The committed rows were loaded with these mappings; a fresh LLM answer could differ
+        column_map, image_map = checkpoint["column_mapping"], checkpoint["image_mapping"]
+        logger.info(f"Resuming upload at {checkpoint['phase']} sheet {checkpoint['sheet_name']!r} row {checkpoint['rows']}")
+    else:
+        checkpoint = None
+        with track_stage("profile", fmt):
+            profiles = profile_sheets(sheets_data)
+            column_profiles = format_profiles(profiles)
+        signature = sheet_signature(sheets_data)
+        with track_stage("mapping", fmt):
+            column_map, image_map = await asyncio.gather(
+                resolve_mapping("column", sheets_data, lambda: generate_column_mapping(
+                    column_profiles=column_profiles,
+                    db_fields=get_model_fields(Product),
+                    on_queue=on_queue
+                ), signature, profiles),
+                resolve_mapping("image", sheets_data, lambda: generate_image_mapping(
+                    column_profiles=column_profiles,
+                    on_queue=on_queue
+                ), signature, profiles)
+            )
+
+    async def on_batch(stage: str, rows_processed: int):
+        await report(stage, 40 if stage == "products" else 75, rows_processed)
+
+    resume_rejects = checkpoint.get("rejects") if checkpoint else None
+    with RejectedRowsWriter(rejects_path, resume_rejects) if rejects_path else nullcontext() as rejects:
+        if dry_run:
+            await report("validating", 40)
+            result = await UploadValidator(db, supplier_id, rejects=rejects).validate(sheets_data, column_map, image_map)
+        else:
+            await report("products", 40)
+            inserter = BulkInserter(db, supplier_id, on_progress=on_batch, rejects=rejects, file_format=fmt,
+                                    checkpoint=checkpoint, on_checkpoint=on_checkpoint)
+            result = await inserter.process_sheets(sheets_data, column_map, image_map)
+        if rejects:
+            result["rejected_rows"] = rejects.summary()
+
+    return {
+        "column_mapping": column_map,
+        "image_mapping": image_map,
+        "result": result
+    }
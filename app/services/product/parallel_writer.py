@@ -0,0 +1,80 @@
+from typing import Any, Dict, List
+import asyncio
+import logging
+import os
+import time
+import pandas as pd
+from app.core.database import AsyncSessionLocal
+from app.services.product.copy_loader import CopyStagingLoader
+
+logger = logging.getLogger(__name__)
+
+# Each writer holds one pooled connection for the whole upload; keep this well
+# below the engine's pool_size + max_overflow.
+DEFAULT_WRITERS = int(os.getenv("BULK_PARALLEL_WRITERS", "1"))
+MAX_WRITERS = 16
+
+
+class WriterSlot:
+    """One dedicated session (and transaction) that a partition of the rows is written through"""
+
+    def __init__(self, index: int, session, use_copy: bool):
+        self.index = index
+        self.db = session
+        self.copy_loader = CopyStagingLoader(session) if use_copy else None
+        self.rows = 0
+        self.busy_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "writer": self.index,
+            "rows": self.rows,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "rows_per_second": round(self.rows / self.busy_seconds, 1) if self.busy_seconds else None,
+        }
+
+
+class PartitionedWriters:
+    """N writer sessions that rows are spread across by a hash of their product ID.
+
+    Products and their images hash to the same writer, so an image row always
+    references a product that is committed or pending in its own transaction,
+    and no two writers ever lock the same row. Nothing is committed until every
+    writer has finished; then all commit, or on any failure all roll back.
+    """
+
+    def __init__(self, count: int, use_copy: bool = False):
+        self.count = max(1, min(count, MAX_WRITERS))
+        self.use_copy = use_copy
+        self.slots: List[WriterSlot] = []
+
+    async def __aenter__(self) -> "PartitionedWriters":
+        self.slots = [WriterSlot(i, AsyncSessionLocal(), self.use_copy) for i in range(self.count)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await asyncio.gather(*[slot.db.close() for slot in self.slots], return_exceptions=True)
+
+    def partition(self, frame: pd.DataFrame, key_column: str = "product_id") -> List[pd.DataFrame]:
+        """Split a cleaned frame into one (possibly empty) frame per writer"""
+        if self.count == 1:
+            return [frame]
+        buckets = pd.util.hash_pandas_object(frame[key_column].astype(str), index=False).to_numpy() % self.count
+        return [frame[buckets == i] for i in range(self.count)]
+
+    def record(self, slot: WriterSlot, rows: int, started: float) -> None:
+        slot.rows += rows
+        slot.busy_seconds += time.perf_counter() - started
+
+    async def commit(self) -> None:
+        # Every writer has already flushed its rows; the remaining risk of a
+        # partial outcome is one COMMIT failing after another succeeded.
+        for slot in self.slots:
+            await slot.db.commit()
+        logger.info(f"Committed {self.count} parallel writers: {self.stats()}")
+
+    async def rollback(self) -> None:
+        await asyncio.gather(*[slot.db.rollback() for slot in self.slots], return_exceptions=True)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [slot.stats() for slot in self.slots]
@@ -0,0 +1,96 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Frames waiting to be cleaned and row batches waiting to be written; together
+# these bound how much parsed data an upload holds in memory at once.
+PARSE_QUEUE_DEPTH = int(os.getenv("PIPELINE_PARSE_QUEUE_DEPTH", "2"))
+WRITE_QUEUE_DEPTH = int(os.getenv("PIPELINE_WRITE_QUEUE_DEPTH", "4"))
+
+_DONE = object()
+
+
+async def run_pipeline(
+    source: Iterable[Any],
+    clean: Callable[[Any], List[Any]],
+    write: Callable[[Any], Awaitable[None]],
+    parse_depth: int = PARSE_QUEUE_DEPTH,
+    write_depth: int = WRITE_QUEUE_DEPTH,
+    writers: int = 1,
+    route: Optional[Callable[[Any], int]] = None,
+    prepare: Optional[Callable[[Any], Awaitable[None]]] = None,
+) -> Dict[str, float]:
+    """Run parse -> clean -> write as concurrent stages joined by bounded queues.
+
+    `source` is a blocking iterator (e.g. CSV chunks) that is advanced on a
+    worker thread, `clean` turns one item into write batches on a worker thread
+    and `write` is awaited for every batch. A full queue blocks the stage in
+    front of it, so a slow database throttles parsing instead of buffering the
+    whole upload. Items are cleaned and written in source order.
+
+    With `writers` > 1 there is one write queue and consumer per writer and
+    `route(batch)` picks the queue, so batches for different writers are
+    written concurrently while each writer still sees its batches in order.
+
+    `prepare(item)`, when given, is awaited on the event loop before an item is
+    cleaned, for lookups the cleaning depends on (e.g. database queries).
+
+    Returns the busy time of each stage and the wall time in seconds.
+    """
+    parsed: asyncio.Queue = asyncio.Queue(maxsize=max(1, parse_depth))
+    writers = max(1, writers)
+    batches: List[asyncio.Queue] = [asyncio.Queue(maxsize=max(1, write_depth)) for _ in range(writers)]
+    stats = {"parse_seconds": 0.0, "prepare_seconds": 0.0, "clean_seconds": 0.0, "write_seconds": 0.0}
+
+    async def parse_stage():
+        iterator = iter(source)
+        while True:
+            started = time.perf_counter()
+            item = await asyncio.to_thread(next, iterator, _DONE)
+            stats["parse_seconds"] += time.perf_counter() - started
+            await parsed.put(item)
+            if item is _DONE:
+                return
+
+    async def clean_stage():
+        while (item := await parsed.get()) is not _DONE:
+            if prepare:
+                started = time.perf_counter()
+                await prepare(item)
+                stats["prepare_seconds"] += time.perf_counter() - started
+            started = time.perf_counter()
+            cleaned = await asyncio.to_thread(clean, item)
+            stats["clean_seconds"] += time.perf_counter() - started
+            for batch in cleaned:
+                await batches[route(batch) if route else 0].put(batch)
+        for queue in batches:
+            await queue.put(_DONE)
+
+    async def write_stage(queue: asyncio.Queue):
+        while (batch := await queue.get()) is not _DONE:
+            started = time.perf_counter()
+            await write(batch)
+            stats["write_seconds"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(parse_stage()), asyncio.create_task(clean_stage())]
+    tasks += [asyncio.create_task(write_stage(queue)) for queue in batches]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception():
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    stats["wall_seconds"] = time.perf_counter() - started
+    logger.info(
+        f"Pipeline finished in {stats['wall_seconds']:.2f}s (parse {stats['parse_seconds']:.2f}s, "
+        f"clean {stats['clean_seconds']:.2f}s, write {stats['write_seconds']:.2f}s)"
+    )
+    return stats
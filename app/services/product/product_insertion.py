@@ -1,184 +1,486 @@
-from typing import List, Dict, Any, Tuple, Set, Optional
-from datetime import datetime, timedelta
-from sqlalchemy import Table, select
+from typing import List, Dict, Any, Awaitable, Callable, Iterator, Tuple, Set, Optional
+from asyncpg import PostgresError
+from sqlalchemy import Table, func
 from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError, InterfaceError
 from fastapi import HTTPException
+import asyncio
+import logging
+import numpy as np
+import pandas as pd
+import os
 import time
-import re
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import observe_stage, track_stage
 from app.models.product_image import ProductImage
+from app.services.product.converters import Converter, compile_converters
+from app.services.product.copy_loader import CopyStagingLoader, changed_rows_only, execute_counted_upsert
+from app.services.product.id_index import JOIN_SAMPLE_ROWS, ProductIdIndex, detect_join_column, resolve_product_ids
+from app.services.product.parallel_writer import DEFAULT_WRITERS, PartitionedWriters, WriterSlot
+from app.services.product.pipeline import run_pipeline
+from app.services.product.rejected_rows import (
+    CONVERSION_ERROR, DUPLICATE_ID, MISSING_ID, NO_IMAGE_DATA, NO_MATCHING_PRODUCT, WRITE_FAILED,
+    RejectedRowsWriter
+)
+from app.utils.sample_data import SheetData
+
+logger = logging.getLogger(__name__)
+
+LOAD_MODES = ("insert", "copy")
+DEFAULT_LOAD_MODE = os.getenv("BULK_LOAD_MODE", "insert")
+# upload: one transaction for the whole upload (all or nothing)
+# savepoint: one transaction, but each batch runs in a savepoint so a failing batch is rejected on its own
+# batch: commit after every parsed frame and record a checkpoint an interrupted upload resumes from
+TRANSACTION_MODES = ("upload", "savepoint", "batch")
+DEFAULT_TRANSACTION_MODE = os.getenv("BULK_TRANSACTION_MODE", "upload")
+# Most rows one batch-mode commit covers; larger Parquet or Arrow batches are split to this size
+BATCH_COMMIT_ROWS = int(os.getenv("BATCH_COMMIT_ROWS", "5000"))
+HASH_COLUMN = "content_hash"
+PHASES = ("products", "images")
+
+# Called with the writing session and the checkpoint; must write it without committing
+CheckpointCallback = Callable[[Any, Dict[str, Any]], Awaitable[None]]
+# Sheet name, frame as read and spreadsheet row of its first row, for a batch cleaned from that frame
+BatchSource = Tuple[str, pd.DataFrame, int]
+# (writer index, cleaned rows, checkpoint, source)
+WriteItem = Tuple[int, pd.DataFrame, Optional[Dict[str, Any]], Optional[BatchSource]]
+
 
 class BulkInserter:
-    def __init__(self, db, supplier_id: int):
+    def __init__(self, db, supplier_id: int, load_mode: str = DEFAULT_LOAD_MODE,
+                 on_progress: Optional[Callable[[str, int], Awaitable[None]]] = None,
+                 writers: int = DEFAULT_WRITERS, rejects: Optional[RejectedRowsWriter] = None,
+                 file_format: str = "unknown", transaction_mode: str = DEFAULT_TRANSACTION_MODE,
+                 checkpoint: Optional[Dict[str, Any]] = None, on_checkpoint: Optional[CheckpointCallback] = None):
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode '{load_mode}', expected one of {LOAD_MODES}")
+        if transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(f"Unknown transaction mode '{transaction_mode}', expected one of {TRANSACTION_MODES}")
+        if transaction_mode == "batch" and writers > 1:
+            # Parallel writers only commit together, which is what batch mode gives up
+            logger.warning(f"Transaction mode 'batch' writes through one session; ignoring {writers} parallel writers")
+            writers = 1
         self.db = db
         self.supplier_id = supplier_id
+        self.load_mode = load_mode
+        self.on_progress = on_progress
+        self.rejects = rejects
+        self.file_format = file_format
+        self.copy_loader = CopyStagingLoader(db) if load_mode == "copy" else None
+        self.writer_count = max(1, writers)
+        self.writers: Optional[PartitionedWriters] = None
+        self.transaction_mode = transaction_mode
+        self.resume_from = checkpoint
+        self.on_checkpoint = on_checkpoint
+        # Final counts of the phases already finished, carried in every checkpoint
+        self.phase_counts: Dict[str, Dict[str, int]] = dict(checkpoint["counts"]) if checkpoint else {}
+        self.mappings: Dict[str, Dict[str, str]] = {}
         self.batch_size = 5000
         self.image_batch_size = 2000
+        self.copy_batch_size = 50000
         self.max_parameters = 30000
-        self.product_ids: Set[str] = set()
-        self.product_id_mapping: Dict[str, str] = {}
+        self.product_index = ProductIdIndex()
         self.debug_stats = {
             'total_rows_processed': 0,
+            'rows_parsed': 0,
             'products_processed': 0,
             'images_processed': 0,
             'processing_start_time': None,
             'products_start_time': None,
-            'images_start_time': None
+            'images_start_time': None,
+            'checkpoints': 0,
+            'failed_batches': 0
         }
 
-    async def process_sheets(self, sheets_data: List[Tuple[str, List[str], List[Dict[str, Any]]]], column_map: Dict[str, str], image_map: Dict[str, str]) -> Dict[str, Any]:
+    async def process_sheets(self, sheets_data: List[SheetData], column_map: Dict[str, str], image_map: Dict[str, str]) -> Dict[str, Any]:
         self.debug_stats['processing_start_time'] = time.time()
+        self.mappings = {"column_mapping": column_map, "image_mapping": image_map}
         try:
-            product_sheets, image_sheets = self._classify_sheets(sheets_data, column_map, image_map)
-            self.debug_stats['products_start_time'] = time.time()
-            product_result = await self._process_products(product_sheets, column_map)
-            products_time = time.time() - self.debug_stats['products_start_time']
-            await self._refresh_product_ids_enhanced()
-            self.debug_stats['images_start_time'] = time.time()
-            image_result = await self._process_images_enhanced(image_sheets, image_map)
-            images_time = time.time() - self.debug_stats['images_start_time']
-            total_time = time.time() - self.debug_stats['processing_start_time']
-            return {
-                "products": product_result,
-                "images": image_result,
-                "debug_stats": {
-                    "total_time": total_time,
-                    "products_time": products_time,
-                    "images_time": images_time,
-                    "total_rows": self.debug_stats['total_rows_processed']
-                }
-            }
+            if self.writer_count > 1:
+                result = await self._process_partitioned(sheets_data, column_map, image_map)
+            else:
+                result = await self._process_phases(sheets_data, column_map, image_map)
+            await self.db.commit()
+            return result
         except Exception as e:
+            # Batch mode keeps what earlier checkpoints committed; only the open frame is lost
             await self.db.rollback()
             raise HTTPException(status_code=500, detail=f"Bulk insert failed: {str(e)}")
-        finally:
-            await self.db.commit()
 
-    def _classify_sheets(self, sheets_data: List[Tuple[str, List[str], List[Dict[str, Any]]]], column_map: Dict[str, str], image_map: Dict[str, str]) -> Tuple[List, List]:
+    async def _process_partitioned(self, sheets_data: List[SheetData], column_map: Dict[str, str], image_map: Dict[str, str]) -> Dict[str, Any]:
+        """Write through N parallel writer transactions that commit only if all succeed"""
+        async with PartitionedWriters(self.writer_count, use_copy=self.copy_loader is not None) as writers:
+            self.writers = writers
+            try:
+                result = await self._process_phases(sheets_data, column_map, image_map)
+                await writers.commit()
+            except Exception:
+                await writers.rollback()
+                raise
+            finally:
+                self.writers = None
+        result["debug_stats"]["writers"] = writers.stats()
+        return result
+
+    async def _process_phases(self, sheets_data: List[SheetData], column_map: Dict[str, str], image_map: Dict[str, str]) -> Dict[str, Any]:
+        product_sheets, image_sheets = self._classify_sheets(sheets_data, column_map, image_map)
+        self.debug_stats['products_start_time'] = time.time()
+        if self._phase_done("products"):
+            product_result = self._phase_result(len(product_sheets), self.phase_counts["products"])
+        else:
+            product_result = await self._process_products(product_sheets, column_map)
+        products_time = time.time() - self.debug_stats['products_start_time']
+        await self._report_progress("images", 0)
+        self.debug_stats['images_start_time'] = time.time()
+        image_result = await self._process_images_enhanced(image_sheets, image_map, column_map.get('product_id'))
+        images_time = time.time() - self.debug_stats['images_start_time']
+        # Both phases read the sheets; parsing is recorded once per job, over both passes
+        pipelines = [self.debug_stats.get('products_pipeline'), self.debug_stats.get('images_pipeline')]
+        observe_stage("parse", self.file_format, sum(stats['parse_seconds'] for stats in pipelines if stats),
+                      self.debug_stats['rows_parsed'])
+        total_time = time.time() - self.debug_stats['processing_start_time']
+        return {
+            "products": product_result,
+            "images": image_result,
+            "debug_stats": {
+                "total_time": total_time,
+                "products_time": products_time,
+                "images_time": images_time,
+                "total_rows": self.debug_stats['total_rows_processed'],
+                "transaction_mode": self.transaction_mode,
+                "checkpoints": self.debug_stats['checkpoints'],
+                "failed_batches": self.debug_stats['failed_batches'],
+                "resumed_from": self._resume_summary(),
+                "products_pipeline": self.debug_stats.get('products_pipeline'),
+                "images_pipeline": self.debug_stats.get('images_pipeline')
+            }
+        }
+
+    def _classify_sheets(self, sheets_data: List[SheetData], column_map: Dict[str, str], image_map: Dict[str, str]) -> Tuple[List, List]:
         product_cols = set(column_map.values())
         product_sheets, image_sheets = [], []
-        for sheet_name, columns, rows in sheets_data:
-            self.debug_stats['total_rows_processed'] += len(rows)
+        for sheet_name, columns, frames in sheets_data:
             if any(c in product_cols for c in columns):
-                product_sheets.append((sheet_name, columns, rows))
-            image_sheets.append((sheet_name, columns, rows))
+                product_sheets.append((sheet_name, columns, frames))
+            image_sheets.append((sheet_name, columns, frames))
         return product_sheets, image_sheets
 
-    async def _refresh_product_ids_enhanced(self):
-        from app.models.product import Product
-        result = await self.db.execute(
-            select(Product.product_id).where(Product.supplier_id == self.supplier_id)
-        )
-        product_ids = result.scalars().all()
-        self.product_ids = set()
-        self.product_id_mapping = {}
-        for original_id in product_ids:
-            if original_id is not None:
-                original_id = str(original_id)
-                for variant in self._normalize_value_enhanced(original_id):
-                    self.product_ids.add(variant)
-                    self.product_id_mapping[variant] = original_id
-
-    def _normalize_value_enhanced(self, value: Any) -> List[str]:
-        if value is None:
-            return []
+    async def _report_progress(self, stage: str, rows_processed: int) -> None:
+        if self.on_progress:
+            await self.on_progress(stage, rows_processed)
+
+    def _reject(self, sheet: Optional[str], frame: pd.DataFrame, mask: Optional[pd.Series], reason: str,
+                column: Optional[str] = None, first_row: Optional[int] = None) -> None:
+        if self.rejects:
+            self.rejects.add(sheet, frame, mask, reason, column, first_row)
+
+    def _reject_failed_write(self, rows: pd.DataFrame, source: BatchSource, column: str) -> None:
+        """Report the sheet rows behind a batch whose write was rolled back, as they were read"""
+        sheet_name, frame, first_row = source
+        # Cleaned rows keep the index of the frame they were cleaned from
+        self._reject(sheet_name, frame, pd.Series(frame.index.isin(rows.index), index=frame.index),
+                     WRITE_FAILED, column, first_row)
+
+    def _iter_frames(self, frames: Any, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        if hasattr(frames, 'iter_frames'):
+            yield from frames.iter_frames(columns)
+        else:
+            for frame in frames:
+                yield frame if columns is None else frame[[c for c in columns if c in frame.columns]]
+
+    def _with_content_hash(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Add a stable 64-bit fingerprint of each row's values and column set"""
+        columns = sorted(frame.columns)
+        row_hashes = pd.util.hash_pandas_object(frame[columns], index=False).to_numpy()
+        column_set = pd.util.hash_array(np.array(["\x1f".join(columns)], dtype=object))[0]
+        return frame.assign(**{HASH_COLUMN: (row_hashes ^ column_set).view(np.int64)})
+
+    def _frame_records(self, frame: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Convert a cleaned frame to DB rows; the only place rows become dicts"""
+        return frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+
+    def _frame_batches(self, frame: pd.DataFrame, batch_size: int, source: BatchSource) -> List[WriteItem]:
+        """Split a cleaned frame into (writer index, rows, checkpoint, source) batches.
+
+        The rows stay frame slices; they become dicts only when their write
+        starts, so batches waiting in the queue hold no per-row objects.
+        """
+        partitions = self.writers.partition(frame) if self.writers else [frame]
+        return [(slot, part.iloc[start:start + batch_size], None, source)
+                for slot, part in enumerate(partitions)
+                for start in range(0, len(part), batch_size)]
+
+    def _writer_slot(self, index: int) -> Optional[WriterSlot]:
+        return self.writers.slots[index] if self.writers else None
+
+    def _phase_done(self, phase: str) -> bool:
+        """Whether an earlier attempt already committed the whole phase"""
+        return bool(self.resume_from) and PHASES.index(phase) < PHASES.index(self.resume_from["phase"])
+
+    def _rows_done(self, phase: str, sheet_index: int) -> Optional[int]:
+        """Data rows of a sheet an earlier attempt already committed; None when the whole sheet is done"""
+        checkpoint = self.resume_from
+        if not checkpoint or checkpoint["phase"] != phase:
+            return None if self._phase_done(phase) else 0
+        if sheet_index < checkpoint["sheet"]:
+            return None
+        return checkpoint["rows"] if sheet_index == checkpoint["sheet"] else 0
+
+    def _resume_summary(self) -> Optional[Dict[str, Any]]:
+        if not self.resume_from:
+            return None
+        return {key: self.resume_from[key] for key in ("phase", "sheet_name", "rows")}
+
+    def _initial_counts(self, phase: str) -> Dict[str, int]:
+        # "skipped" is counted while cleaning, "failed" (batches whose write was rolled back) while writing
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        if self.resume_from and self.resume_from["phase"] == phase:
+            counts.update(self.resume_from["counts"].get(phase, {}))
+        return {**counts, "failed": 0}
+
+    def _committed_counts(self, counts: Dict[str, int], skipped: int) -> Dict[str, int]:
+        return {"inserted": counts["inserted"], "updated": counts["updated"], "unchanged": counts["unchanged"],
+                "skipped": skipped + counts["failed"]}
+
+    @staticmethod
+    def _phase_result(sheets: int, counts: Dict[str, int]) -> Dict[str, int]:
+        return {
+            "sheets": sheets,
+            "rows_inserted": counts["inserted"],
+            "rows_updated": counts["updated"],
+            "rows_unchanged": counts["unchanged"],
+            "rows_skipped": counts["skipped"] + counts.get("failed", 0)
+        }
+
+    def _resumed_frames(self, frames: Any, columns: Optional[List[str]], rows_done: int,
+                        on_skipped: Optional[Callable[[pd.DataFrame], None]] = None) -> Iterator[Tuple[pd.DataFrame, int]]:
+        """Frames of a sheet past its first `rows_done` data rows, each with the offset of its first row.
+
+        In batch mode every frame is one commit, so frames are cut to at most
+        BATCH_COMMIT_ROWS rows whatever batch size the file was written with.
+        """
+        offset = 0
+        step = BATCH_COMMIT_ROWS if self.transaction_mode == "batch" else None
+        for frame in self._iter_frames(frames, columns):
+            self.debug_stats['rows_parsed'] += len(frame)
+            start, offset = offset, offset + len(frame)
+            if start < rows_done:
+                done = min(len(frame), rows_done - start)
+                if on_skipped:
+                    on_skipped(frame.iloc[:done])
+                frame, start = frame.iloc[done:], start + done
+                if not len(frame):
+                    continue
+            if not step or len(frame) <= step:
+                yield frame, start
+                continue
+            for i in range(0, len(frame), step):
+                yield frame.iloc[i:i + step], start + i
+
+    def _frame_output(self, batches: List[Tuple], rejected: List[Tuple], phase: str, sheet_index: int,
+                      sheet_name: str, rows: int, skipped: int) -> List[Tuple]:
+        """Write items for one cleaned frame.
+
+        In batch mode the frame's last item carries its checkpoint together with
+        its rejected rows, which are only reported once the frame commits, so on
+        resume the report can be cut back to exactly what was committed.
+        """
+        if self.transaction_mode != "batch":
+            for args in rejected:
+                self._reject(*args)
+            return batches
+        marker = {"phase": phase, "sheet": sheet_index, "sheet_name": sheet_name, "rows": rows,
+                  "skipped": skipped, "rejected": rejected}
+        if not batches:
+            return [(0, pd.DataFrame(), marker, None)]
+        slot, batch, _, source = batches[-1]
+        return batches[:-1] + [(slot, batch, marker, source)]
+
+    async def _commit_frame(self, marker: Dict[str, Any], counts: Dict[str, int]) -> None:
+        for args in marker["rejected"]:
+            self._reject(*args)
+        await self._save_checkpoint(marker["phase"], marker["sheet"], marker["sheet_name"], marker["rows"],
+                                    self._committed_counts(counts, marker["skipped"]))
+
+    async def _save_checkpoint(self, phase: str, sheet: int, sheet_name: Optional[str], rows: int,
+                               counts: Optional[Dict[str, int]]) -> None:
+        """Commit everything written so far together with the point an interrupted upload resumes from"""
+        checkpoint = {
+            "phase": phase,
+            "sheet": sheet,
+            "sheet_name": sheet_name,
+            "rows": rows,
+            "counts": {**self.phase_counts, **({phase: counts} if counts else {})},
+            "rejects": self.rejects.mark() if self.rejects else None,
+            **self.mappings,
+        }
+        if self.on_checkpoint:
+            await self.on_checkpoint(self.db, checkpoint)
+        await self.db.commit()
+        self.debug_stats['checkpoints'] += 1
+
+    async def _isolated_write(self, write: Callable[[], Awaitable[Tuple[int, int]]],
+                              slot: Optional[WriterSlot] = None) -> Optional[Tuple[int, int]]:
+        """Run one batch write in a savepoint; a batch the database refuses is rolled back alone and None returned"""
+        db = slot.db if slot else self.db
         try:
-            variants = []
-            str_val = str(value).strip()
-            if not str_val:
-                return []
-            variants.extend([str_val, str_val.upper(), str_val.lower()])
-            try:
-                if str_val.replace('.', '').replace('-', '').replace('_', '').isdigit():
-                    float_val = float(str_val)
-                    if float_val.is_integer():
-                        clean_num = str(int(float_val))
-                        variants.extend([clean_num, clean_num.upper(), clean_num.lower()])
-                    clean_no_zeros = str_val.lstrip('0') or '0'
-                    variants.extend([clean_no_zeros, clean_no_zeros.upper(), clean_no_zeros.lower()])
-            except (ValueError, TypeError):
-                pass
-            clean_val = re.sub(r'\s+', '', str_val)
-            if clean_val != str_val:
-                variants.extend([clean_val, clean_val.upper(), clean_val.lower()])
-            unique_variants = []
-            seen = set()
-            for v in variants:
-                if v and v not in seen:
-                    unique_variants.append(v)
-                    seen.add(v)
-            return unique_variants
-        except Exception:
-            return [str(value)] if value else []
+            async with db.begin_nested():
+                return await write()
+        except (DBAPIError, PostgresError, ValueError, TypeError) as e:
+            # A lost connection fails every later batch too, so it still fails the upload
+            if isinstance(e, InterfaceError) or getattr(e, "connection_invalidated", False):
+                raise
+            self.debug_stats['failed_batches'] += 1
+            logger.warning(f"Batch write failed and was rolled back to its savepoint: {e}")
+            return None
 
-    async def _process_products(self, sheets: List[Tuple[str, List[str], List[Dict[str, Any]]]], column_map: Dict[str, str]) -> Dict[str, int]:
+    async def _process_products(self, sheets: List[SheetData], column_map: Dict[str, str]) -> Dict[str, int]:
         from app.models.product import Product
         reverse_map = {v: k for k, v in column_map.items() if v}
-        total_inserted = 0
-        total_skipped = 0
-        for sheet_name, columns, rows in sheets:
-            batch = []
-            seen_ids = set()
-            sheet_inserted = 0
-            sheet_skipped = 0
-            for row in rows:
-                try:
-                    raw_pid = row.get(column_map.get('product_id', ''), '')
-                    pid = self._normalize_value(raw_pid)
-                    if not pid or pid in seen_ids:
-                        total_skipped += 1
-                        sheet_skipped += 1
-                        continue
-                    item = {'supplier_id': self.supplier_id, 'product_id': pid}
-                    valid_row = True
-                    for col in columns:
-                        db_col = reverse_map.get(col)
-                        if db_col and db_col not in {'product_id', 'supplier_id'}:
-                            item[db_col] = self._clean_value(row.get(col), db_col)
-                    if any(item.get(col) is None for col in ['product_id', 'supplier_id']):
-                        valid_row = False
-                    if valid_row:
-                        seen_ids.add(pid)
-                        batch.append(item)
-                    else:
-                        total_skipped += 1
-                        sheet_skipped += 1
-                    if len(batch) >= self._calculate_batch_size(batch):
-                        await self._bulk_upsert(Product.__table__, batch, ['product_id'])
-                        total_inserted += len(batch)
-                        sheet_inserted += len(batch)
-                        batch = []
-                except Exception:
-                    total_skipped += 1
-                    sheet_skipped += 1
-            if batch:
-                await self._bulk_upsert(Product.__table__, batch, ['product_id'])
-                total_inserted += len(batch)
-                sheet_inserted += len(batch)
-        self.debug_stats['products_processed'] = total_inserted
-        return {
-            "sheets": len(sheets),
-            "rows_inserted": total_inserted,
-            "rows_skipped": total_skipped
-        }
+        pid_col = column_map.get('product_id')
+        counts = self._initial_counts("products")
+
+        def parse():
+            for sheet_index, (sheet_name, columns, frames) in enumerate(sheets):
+                rows_done = self._rows_done("products", sheet_index)
+                if rows_done is None:
+                    continue
+                seen_ids = set()
+                db_cols = self._product_db_columns(columns, reverse_map)
+                converters = compile_converters(Product.__table__, db_cols)
+
+                def remember(done: pd.DataFrame) -> None:
+                    # Rows an earlier attempt committed are not loaded again, but their IDs still count as seen
+                    if pid_col in done.columns:
+                        seen_ids.update(done[pid_col].map(self._normalize_value))
+
+                # Only the mapped columns are read; formats that support it never decode the rest
+                wanted = [pid_col, *db_cols] if pid_col in columns else None
+                for frame, offset in self._resumed_frames(frames, wanted, rows_done, remember):
+                    yield sheet_index, sheet_name, frame, db_cols, converters, seen_ids, offset
+
+        def clean(item) -> List[Tuple]:
+            with track_stage("clean", self.file_format, batch=True) as record:
+                record["rows"] = len(item[2])
+                sheet_index, sheet_name, frame, _, _, _, offset = item
+                batches, rejected = clean_frame(item)
+                return self._frame_output(batches, rejected, "products", sheet_index, sheet_name,
+                                          offset + len(frame), counts["skipped"])
 
-    def _calculate_batch_size(self, current_batch: List[Dict]) -> int:
-        if not current_batch:
+        def clean_frame(item) -> Tuple[List[Tuple], List[Tuple]]:
+            _, sheet_name, frame, db_cols, converters, seen_ids, offset = item
+            first_row = offset + 2  # spreadsheet row of the first data row, below the header
+            self.debug_stats['total_rows_processed'] += len(frame)
+            if pid_col not in frame.columns:
+                counts["skipped"] += len(frame)
+                return [], [(sheet_name, frame, None, MISSING_ID, 'product_id', first_row)]
+            try:
+                cleaned, rejected = self._clean_product_frame(frame, pid_col, db_cols, converters, seen_ids)
+            except Exception:
+                counts["skipped"] += len(frame)
+                return [], [(sheet_name, frame, None, CONVERSION_ERROR, None, first_row)]
+            for reason, column, mask in rejected:
+                if reason != CONVERSION_ERROR:
+                    # Cells that fail to convert are loaded empty; the row itself is kept
+                    counts["skipped"] += int(mask.sum())
+            # Images can join to these rows before they are committed; the parallel
+            # writers' pending rows are invisible to any other session anyway
+            self.product_index.add(cleaned['product_id'])
+            cleaned = self._with_content_hash(cleaned)
+            return (self._frame_batches(cleaned, self._calculate_batch_size(len(cleaned.columns)),
+                                        (sheet_name, frame, first_row)),
+                    [(sheet_name, frame, mask, reason, column, first_row) for reason, column, mask in rejected])
+
+        async def write(item: WriteItem):
+            slot, rows, checkpoint, source = item
+            started = time.perf_counter()
+            batch = await asyncio.to_thread(self._frame_records, rows)
+            written = await self._write_products(Product.__table__, batch, self._writer_slot(slot))
+            observe_stage("product_write", self.file_format, time.perf_counter() - started, len(batch), batch=True)
+            if self.writers:
+                self.writers.record(self.writers.slots[slot], len(batch), started)
+            if written is None:
+                counts["failed"] += len(batch)
+                self.product_index.discard(rows['product_id'])
+                self._reject_failed_write(rows, source, 'products')
+            else:
+                inserted, updated = written
+                counts["inserted"] += inserted
+                counts["updated"] += updated
+                counts["unchanged"] += len(batch) - inserted - updated
+            if checkpoint:
+                await self._commit_frame(checkpoint, counts)
+            await self._report_progress("products", self.debug_stats['total_rows_processed'])
+
+        self.debug_stats['products_pipeline'] = await run_pipeline(
+            parse(), clean, write, writers=self.writer_count if self.writers else 1, route=lambda item: item[0]
+        )
+        self.debug_stats['products_processed'] = counts["inserted"] + counts["updated"] + counts["unchanged"]
+        if self.transaction_mode == "batch":
+            # A resumed upload that gets past this point skips the product phase entirely
+            self.phase_counts["products"] = self._committed_counts(counts, counts["skipped"])
+            await self._save_checkpoint("images", 0, None, 0, None)
+        return self._phase_result(len(sheets), counts)
+
+    def _product_db_columns(self, columns: List[str], reverse_map: Dict[str, str]) -> Dict[str, str]:
+        """Sheet column -> products column for every mapped column the loader writes"""
+        from app.models.product import Product
+        table = Product.__table__
+        return {col: reverse_map[col] for col in columns
+                if col in reverse_map and reverse_map[col] not in {'product_id', 'supplier_id', HASH_COLUMN}
+                # Generated columns (canonical_id, search_vector) are computed by the database
+                and not (reverse_map[col] in table.c and table.c[reverse_map[col]].computed is not None)}
+
+    def _clean_product_frame(self, frame: pd.DataFrame, pid_col: str, db_cols: Dict[str, str],
+                             converters: Dict[str, Converter],
+                             seen_ids: Set[str]) -> Tuple[pd.DataFrame, List[Tuple[str, str, pd.Series]]]:
+        """Clean one frame of product rows; also returns (reason, column, row mask) for every problem found"""
+        pids = frame[pid_col].map(self._normalize_value)
+        missing = pids == ""
+        duplicate = ~missing & (pids.duplicated() | pids.isin(seen_ids))
+        keep = ~(missing | duplicate)
+        rejected = [(MISSING_ID, 'product_id', missing), (DUPLICATE_ID, 'product_id', duplicate)]
+        pids = pids[keep]
+        seen_ids.update(pids)
+        cleaned = pd.DataFrame({'supplier_id': self.supplier_id, 'product_id': pids})
+        for col, db_col in db_cols.items():
+            # Whole-column conversion; the converter was picked from the column type once per sheet
+            cleaned[db_col], failed = converters[col](frame.loc[keep, col])
+            if failed.any():
+                rejected.append((CONVERSION_ERROR, db_col, failed.reindex(frame.index, fill_value=False)))
+        return cleaned, [(reason, column, pd.Series(mask, index=frame.index)) for reason, column, mask in rejected]
+
+    async def _write_products(self, table: Table, batch: List[Dict],
+                              slot: Optional[WriterSlot] = None) -> Optional[Tuple[int, int]]:
+        """Upsert one batch of products; None when the batch was rolled back to its savepoint"""
+        if self.transaction_mode == "upload" or not batch:
+            return await self._bulk_upsert(table, batch, ['product_id'], slot)
+        return await self._isolated_write(lambda: self._bulk_upsert(table, batch, ['product_id'], slot), slot)
+
+    def _calculate_batch_size(self, columns_per_row: int) -> int:
+        if self.copy_loader:
+            return self.copy_batch_size
+        if not columns_per_row:
             return 100
-        columns_per_row = len(current_batch[0])
         batch_size = max(1, self.max_parameters // columns_per_row)
         return min(batch_size, 500)
 
-    async def _bulk_upsert(self, table: Table, data: List[Dict], conflict_keys: List[str]) -> None:
+    async def _bulk_upsert(self, table: Table, data: List[Dict], conflict_keys: List[str],
+                           slot: Optional[WriterSlot] = None) -> Tuple[int, int]:
+        """Upsert rows whose content hash changed; returns (inserted, updated)"""
         if not data:
-            return
+            return 0, 0
+        db, copy_loader = (slot.db, slot.copy_loader) if slot else (self.db, self.copy_loader)
+        if copy_loader:
+            return await copy_loader.upsert(table, data, conflict_keys, hash_column=HASH_COLUMN)
         insert_stmt = pg_insert(table).values(data)
         update_cols = [col for col in data[0].keys() if col not in conflict_keys]
         update_dict = {col: getattr(insert_stmt.excluded, col) for col in update_cols}
-        stmt = insert_stmt.on_conflict_do_update(index_elements=conflict_keys, set_=update_dict)
-        await self.db.execute(stmt)
+        stmt = changed_rows_only(insert_stmt, table, update_dict, conflict_keys, HASH_COLUMN)
+        return await execute_counted_upsert(db, stmt)
 
     def _normalize_value(self, value: Any) -> str:
-        if value is None:
+        if value is None or pd.isna(value):
             return ""
         try:
             if isinstance(value, (int, float)):
@@ -188,109 +490,158 @@ class BulkInserter:
         except (ValueError, TypeError):
             return str(value).strip().upper()
 
-    def _clean_value(self, val: Any, db_col: str) -> Any:
-        if val in (None, "", "null", "NULL"):
-            return None
-        try:
-            val_str = str(val).strip()
-            if any(x in db_col for x in ['price', 'weight']):
-                return float(val_str) if val_str else None
-            if any(x in db_col for x in ['qty', 'stock']):
-                return int(float(val_str)) if val_str else None
-            if db_col.startswith('is_') or 'active' in db_col:
-                return val_str.lower() in ('yes', 'true', '1', 'y')
-            if 'date' in db_col or 'time' in db_col:
-                if val_str.isdigit():
-                    try:
-                        base_date = datetime(1899, 12, 30)
-                        days = float(val_str)
-                        if days > 2958465:
-                            return None
-                        parsed = base_date + timedelta(days=days)
-                        if parsed.year < 1900:
-                            return None
-                        return parsed
-                    except:
-                        pass
-                date_formats = ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%Y%m%d", "%Y-%m-%d %H:%M:%S")
-                for fmt in date_formats:
-                    try:
-                        parsed = datetime.strptime(val_str, fmt)
-                        if parsed.year < 1900:
-                            return None
-                        return parsed
-                    except ValueError:
-                        continue
-                return None
-            return val_str
-        except Exception:
+    async def _process_images_enhanced(self, sheets: List[SheetData], image_map: Dict[str, str], id_column: Optional[str] = None) -> Dict[str, int]:
+        # Product IDs outside this upload are looked up as image rows reference them,
+        # on a separate read session since the write stage may be using self.db
+        async with AsyncSessionLocal() as lookup_db:
+            return await self._process_image_sheets(sheets, image_map, id_column, lookup_db)
+
+    async def _resolve_product_ids(self, lookup_db, values: pd.Series) -> None:
+        with track_stage("id_refresh", self.file_format) as record:
+            record["rows"] = len(values)
+            await resolve_product_ids(lookup_db, self.supplier_id, self.product_index, values)
+
+    async def _detect_join_column(self, frames: Any, available_mappings: Dict[str, str], id_column: Optional[str],
+                                  lookup_db) -> Optional[str]:
+        sample = await asyncio.to_thread(frames.head, JOIN_SAMPLE_ROWS)
+        candidates = [col for col in sample.columns if col not in available_mappings]
+        if not candidates:
             return None
+        await self._resolve_product_ids(lookup_db, pd.concat([sample[col] for col in candidates], ignore_index=True))
+        return detect_join_column(sample, self.product_index, exclude=available_mappings.keys(), preferred=id_column)
 
-    async def _process_images_enhanced(self, sheets: List[Tuple[str, List[str], List[Dict[str, Any]]]], image_map: Dict[str, str]) -> Dict[str, int]:
-        if not self.product_ids:
-            return {"sheets": len(sheets), "rows_inserted": 0, "rows_skipped": 0}
-        total_inserted = 0
-        total_skipped = 0
-        sheet_to_db_map = {v: k for k, v in image_map.items()}
-        for sheet_name, columns, rows in sheets:
-            batch = []
+    async def _process_image_sheets(self, sheets: List[SheetData], image_map: Dict[str, str], id_column: Optional[str],
+                                    lookup_db) -> Dict[str, int]:
+        counts = self._initial_counts("images")
+        sheet_to_db_map = {v: k for k, v in image_map.items() if v}
+        batch_size = self.copy_batch_size if self.copy_loader else self.image_batch_size
+
+        join_columns: List[Optional[str]] = []
+        for sheet_index, (sheet_name, columns, frames) in enumerate(sheets):
             available_mappings = {col: sheet_to_db_map[col] for col in columns if col in sheet_to_db_map}
-            if not available_mappings:
-                total_skipped += len(rows)
-                continue
-            for row in rows:
-                matched_id = self._find_product_id_in_row(row)
-                if not matched_id:
-                    total_skipped += 1
+            detect = available_mappings and self._rows_done("images", sheet_index) is not None
+            join_columns.append(
+                await self._detect_join_column(frames, available_mappings, id_column, lookup_db) if detect else None
+            )
+
+        def parse():
+            for sheet_index, ((sheet_name, columns, frames), join_col) in enumerate(zip(sheets, join_columns)):
+                rows_done = self._rows_done("images", sheet_index)
+                if rows_done is None:
                     continue
-                image_entry = {"product_id": matched_id}
-                has_image_data = False
-                for sheet_col, db_field in available_mappings.items():
-                    if sheet_col in row and row[sheet_col]:
-                        cleaned_value = str(row[sheet_col]).strip()
-                        if cleaned_value:
-                            image_entry[db_field] = cleaned_value
-                            has_image_data = True
-                if has_image_data:
-                    batch.append(image_entry)
-                else:
-                    total_skipped += 1
-                if len(batch) >= self.image_batch_size:
-                    inserted = await self._bulk_insert_images(batch)
-                    total_inserted += inserted
-                    batch = []
-            if batch:
-                inserted = await self._bulk_insert_images(batch)
-                total_inserted += inserted
-        return {
-            "sheets": len(sheets), 
-            "rows_inserted": total_inserted, 
-            "rows_skipped": total_skipped
-        }
+                available_mappings = {col: sheet_to_db_map[col] for col in columns if col in sheet_to_db_map}
+                if not join_col and not (self.rejects and available_mappings):
+                    # Nothing to load or report; the sheet is only counted, its row count taking the offset's place
+                    if not rows_done:
+                        yield sheet_index, sheet_name, None, None, available_mappings, self._count_rows(frames)
+                    continue
+                # An image sheet none of whose columns matches a product ID is read only for the report
+                wanted = [join_col, *available_mappings] if join_col else None
+                for frame, offset in self._resumed_frames(frames, wanted, rows_done):
+                    yield sheet_index, sheet_name, frame, join_col, available_mappings, offset
+
+        def clean(item) -> List[Tuple]:
+            with track_stage("image_match", self.file_format, batch=True) as record:
+                sheet_index, sheet_name, frame, _, _, offset = item
+                record["rows"] = len(frame) if frame is not None else 0
+                batches, rejected = clean_frame(item)
+                rows = offset + len(frame) if frame is not None else offset
+                return self._frame_output(batches, rejected, "images", sheet_index, sheet_name, rows, counts["skipped"])
+
+        def clean_frame(item) -> Tuple[List[Tuple], List[Tuple]]:
+            _, sheet_name, frame, join_col, available_mappings, offset = item
+            if frame is None:
+                counts["skipped"] += offset
+                return [], []
+            first_row = offset + 2
+            if not join_col:
+                counts["skipped"] += len(frame)
+                return [], [(sheet_name, frame, None, NO_MATCHING_PRODUCT, 'product_id', first_row)]
+            images, rejected = self._clean_image_frame(frame, join_col, available_mappings)
+            for reason, column, mask in rejected:
+                counts["skipped"] += int(mask.sum())
+            images = self._with_content_hash(images)
+            return (self._frame_batches(images, batch_size, (sheet_name, frame, first_row)),
+                    [(sheet_name, frame, mask, reason, column, first_row) for reason, column, mask in rejected])
 
-    async def _bulk_insert_images(self, batch: List[Dict]) -> int:
+        async def write(item: WriteItem):
+            slot, rows, checkpoint, source = item
+            started = time.perf_counter()
+            batch = await asyncio.to_thread(self._frame_records, rows)
+            written = await self._bulk_insert_images(batch, self._writer_slot(slot))
+            observe_stage("image_write", self.file_format, time.perf_counter() - started, len(batch), batch=True)
+            if self.writers:
+                self.writers.record(self.writers.slots[slot], len(batch), started)
+            if written is None:
+                counts["failed"] += len(batch)
+                self._reject_failed_write(rows, source, 'images')
+            else:
+                inserted, updated = written
+                counts["inserted"] += inserted
+                counts["updated"] += updated
+                counts["unchanged"] += len(batch) - inserted - updated
+            if checkpoint:
+                await self._commit_frame(checkpoint, counts)
+            if written is not None:
+                self.debug_stats['images_processed'] = counts["inserted"] + counts["updated"] + counts["unchanged"]
+                await self._report_progress("images", self.debug_stats['images_processed'])
+
+        async def prepare(item):
+            _, _, frame, join_col, _, _ = item
+            if join_col:
+                await self._resolve_product_ids(lookup_db, frame[join_col])
+
+        self.debug_stats['images_pipeline'] = await run_pipeline(
+            parse(), clean, write, writers=self.writer_count if self.writers else 1, route=lambda item: item[0],
+            prepare=prepare
+        )
+        return self._phase_result(len(sheets), counts)
+
+    def _clean_image_frame(self, frame: pd.DataFrame, join_col: str,
+                           available_mappings: Dict[str, str]) -> Tuple[pd.DataFrame, List[Tuple[str, str, pd.Series]]]:
+        images = pd.DataFrame({"product_id": self.product_index.lookup(frame[join_col])})
+        for sheet_col, db_field in available_mappings.items():
+            values = frame[sheet_col]
+            values = values.where(values.notna(), "").astype(str).str.strip()
+            images[db_field] = values.where(values != "", None)
+        image_fields = list(available_mappings.values())
+        no_match = images["product_id"].isna()
+        no_data = ~no_match & images[image_fields].isna().all(axis=1)
+        keep = ~(no_match | no_data)
+        # One upsert statement cannot touch the same product twice; the last row with images wins
+        superseded = images["product_id"].where(keep).duplicated(keep="last") & keep
+        keep &= ~superseded
+        rejected = [(NO_MATCHING_PRODUCT, 'product_id', no_match), (NO_IMAGE_DATA, 'images', no_data),
+                    (DUPLICATE_ID, 'product_id', superseded)]
+        return images[keep], rejected
+
+    def _count_rows(self, frames: Any) -> int:
+        row_count = getattr(frames, 'row_count', None)
+        if row_count is not None:
+            return row_count
+        return sum(len(frame) for frame in self._iter_frames(frames))
+
+    async def _bulk_insert_images(self, batch: List[Dict], slot: Optional[WriterSlot] = None) -> Optional[Tuple[int, int]]:
         if not batch:
-            return 0
+            return 0, 0
+        if self.transaction_mode != "upload":
+            return await self._isolated_write(lambda: self._bulkimage_upsert(ProductImage.__table__, batch, slot), slot)
         try:
-            await self._bulkimage_upsert(ProductImage.__table__, batch)
-            return len(batch)
+            return await self._bulkimage_upsert(ProductImage.__table__, batch, slot)
         except Exception:
-            return 0
-
-    def _find_product_id_in_row(self, row: Dict[str, Any]) -> Optional[str]:
-        for value in row.values():
-            if not value:
-                continue
-            for variant in self._normalize_value_enhanced(value):
-                if variant in self.product_ids:
-                    return self.product_id_mapping[variant]
-        return None
+            return None
 
-    async def _bulkimage_upsert(self, table: Table, data: List[Dict]) -> None:
+    async def _bulkimage_upsert(self, table: Table, data: List[Dict], slot: Optional[WriterSlot] = None) -> Tuple[int, int]:
         if not data:
-            return
+            return 0, 0
+        db, copy_loader = (slot.db, slot.copy_loader) if slot else (self.db, self.copy_loader)
         conflict_keys = [col.name for col in table.primary_key.columns]
-        update_cols = [col for col in data[0].keys() if col not in conflict_keys]
-        update_dict = {col: getattr(pg_insert(table).excluded, col) for col in update_cols}
-        stmt = pg_insert(table).values(data).on_conflict_do_update(index_elements=conflict_keys, set_=update_dict)
-        await self.db.execute(stmt)
\ No newline at end of file
+        if copy_loader:
+            return await copy_loader.upsert(table, data, conflict_keys, preserve_existing=True, hash_column=HASH_COLUMN)
+        insert_stmt = pg_insert(table).values(data)
+        update_cols = [col for col in data[0].keys() if col not in conflict_keys and col != HASH_COLUMN]
+        # Cells a row leaves empty keep the image already stored
+        update_dict = {col: func.coalesce(getattr(insert_stmt.excluded, col), table.c[col]) for col in update_cols}
+        update_dict[HASH_COLUMN] = insert_stmt.excluded[HASH_COLUMN]
+        stmt = changed_rows_only(insert_stmt, table, update_dict, conflict_keys, HASH_COLUMN)
+        return await execute_counted_upsert(db, stmt)
\ No newline at end of file
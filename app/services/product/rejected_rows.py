@@ -0,0 +1,96 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+import csv
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+REJECTED_ROWS_DIR = Path(os.getenv("REJECTED_ROWS_DIR", "uploads/rejected"))
+REPORT_COLUMNS = ["sheet", "row", "reason", "column", "values"]
+
+# Reason codes shared by the dry-run report and the rejected-rows report
+MISSING_ID = "MISSING_ID"
+DUPLICATE_ID = "DUPLICATE_ID"
+CONVERSION_ERROR = "CONVERSION_ERROR"
+NO_MATCHING_PRODUCT = "NO_MATCHING_PRODUCT"
+NO_IMAGE_DATA = "NO_IMAGE_DATA"
+WRITE_FAILED = "WRITE_FAILED"
+
+
+def rejected_rows_path(job_id: int) -> Path:
+    return REJECTED_ROWS_DIR / f"job_{job_id}.csv"
+
+
+class RejectedRowsWriter:
+    """Append-only CSV of the rows an upload could not load, one line per row and reason.
+
+    Rows go straight to the file as they are found, so the report costs disk
+    space rather than memory however many rows are rejected. `values` holds the
+    row as read from the sheet, encoded as JSON.
+
+    `resume_from` is a `mark()` taken by an earlier attempt of the same job: the
+    report is cut back to that point and continued instead of started over.
+    """
+
+    def __init__(self, path: Path, resume_from: Optional[Dict[str, Any]] = None):
+        self.path = Path(path)
+        self.resume_from = resume_from if resume_from and self.path.exists() else None
+        self.count = 0
+        self.by_reason: Dict[str, int] = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "RejectedRowsWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.resume_from:
+            self._file = open(self.path, "r+", newline="", encoding="utf-8")
+            self._file.truncate(self.resume_from["offset"])
+            self._file.seek(self.resume_from["offset"])
+            self.count = self.resume_from["count"]
+            self.by_reason = dict(self.resume_from["by_reason"])
+            return self
+        # A retried job without a checkpoint starts its report over
+        self._file = open(self.path, "w", newline="", encoding="utf-8")
+        csv.writer(self._file).writerow(REPORT_COLUMNS)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._file.close()
+        if not self.count:
+            self.path.unlink(missing_ok=True)
+
+    def add(self, sheet: str, frame: pd.DataFrame, mask: Optional[pd.Series], reason: str,
+            column: Optional[str] = None, first_row: Optional[int] = None) -> int:
+        """Write the rows of `frame` selected by `mask` (all rows when None).
+
+        `first_row` is the spreadsheet row number of the frame's first row.
+        """
+        positions = np.arange(len(frame)) if mask is None else np.flatnonzero(mask.to_numpy())
+        if not len(positions):
+            return 0
+        rows = frame.iloc[positions]
+        report = pd.DataFrame({
+            "sheet": sheet,
+            "row": positions + first_row if first_row is not None else None,
+            "reason": reason,
+            "column": column,
+            "values": rows.to_json(orient="records", lines=True, date_format="iso").splitlines(),
+        })
+        with self._lock:
+            report.to_csv(self._file, header=False, index=False)
+            self.count += len(report)
+            self.by_reason[reason] = self.by_reason.get(reason, 0) + len(report)
+        return len(report)
+
+    def mark(self) -> Dict[str, Any]:
+        """Position of the report so far, for resuming it from a checkpoint"""
+        with self._lock:
+            self._file.flush()
+            return {"offset": self._file.tell(), "count": self.count, "by_reason": dict(self.by_reason)}
+
+    def summary(self) -> Dict[str, object]:
+        return {"count": self.count, "by_reason": dict(self.by_reason)}
@@ -0,0 +1,17 @@
+from typing import Tuple
+from sqlalchemy import cast, func, literal
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.sql import ColumnElement
+from app.models.product import SEARCH_CONFIG, Product
+
+
+def full_text_search(search: str) -> Tuple[ColumnElement, ColumnElement]:
+    """Match condition and relevance rank of a catalog search term.
+
+    The match is answered from the GIN index on products.search_vector. The
+    term is parsed with websearch_to_tsquery, which accepts what people type in
+    a search box ("quoted phrases", or, -excluded words) and never fails on
+    malformed input. Names outrank keywords, which outrank descriptions.
+    """
+    query = func.websearch_to_tsquery(cast(literal(SEARCH_CONFIG), REGCONFIG), search)
+    return Product.search_vector.op("@@")(query), func.ts_rank_cd(Product.search_vector, query)
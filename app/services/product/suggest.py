@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import os
+import time
+from sqlalchemy import func, literal, literal_column, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.product import Product
+
+SUGGEST_CACHE_TTL = float(os.getenv("SUGGEST_CACHE_TTL", "60"))
+SUGGEST_CACHE_SIZE = int(os.getenv("SUGGEST_CACHE_SIZE", "10000"))
+
+Suggestions = Dict[str, List[str]]
+
+
+def normalize_prefix(term: str) -> str:
+    """Cache key and query text: case and repeated whitespace do not change the suggestions"""
+    return " ".join(term.split()).lower()
+
+
+class SuggestionCache:
+    """In-process LRU of recent suggestions, keyed by normalized prefix and limit.
+
+    Search-as-you-type traffic concentrates on a small set of short prefixes, so
+    these are answered without a database round trip. Entries expire after `ttl`
+    seconds, which bounds how long a new or renamed product stays unsuggested.
+    """
+
+    def __init__(self, ttl: float = SUGGEST_CACHE_TTL, max_entries: int = SUGGEST_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, Suggestions]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, int]) -> Optional[Suggestions]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Tuple[str, int], suggestions: Suggestions) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, suggestions)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+suggestion_cache = SuggestionCache()
+
+
+def _ranked_values(kind: str, column, term: str, limit: int):
+    # `column %> term` is word_similarity(term, column) above pg_trgm's threshold,
+    # the form its GIN index answers; a prefix or a misspelt word both match
+    score = func.max(func.word_similarity(term, column))
+    return (
+        select(literal(kind).label("kind"), column.label("value"), score.label("score"))
+        .where(Product.is_active == True, column.op("%>")(term))
+        .group_by(column)
+        .order_by(score.desc(), func.length(column))
+        .limit(limit)
+        .subquery()
+    )
+
+
+async def suggest_products(db: AsyncSession, term: str, limit: int) -> Suggestions:
+    """Top product names and brands for a partly typed search term, best match first"""
+    prefix = normalize_prefix(term)
+    key = (prefix, limit)
+    cached = suggestion_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Names and brands in one round trip
+    ranked = [_ranked_values("name", Product.product_name, prefix, limit),
+              _ranked_values("brand", Product.brand, prefix, limit)]
+    stmt = union_all(*[select(q.c.kind, q.c.value, q.c.score) for q in ranked]).order_by(
+        literal_column("kind"), literal_column("score").desc(), func.length(literal_column("value"))
+    )
+    suggestions: Suggestions = {"names": [], "brands": []}
+    for kind, value, _ in (await db.execute(stmt)).all():
+        suggestions["names" if kind == "name" else "brands"].append(value)
+    suggestion_cache.put(key, suggestions)
+    return suggestions
@@ -0,0 +1,178 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from app.models.product import Product
+from app.services.product.converters import compile_converters
+from app.services.product.id_index import RESOLVE_BATCH_SIZE
+from app.services.product.pipeline import run_pipeline
+from app.services.product.product_insertion import HASH_COLUMN, BulkInserter
+from app.services.product.rejected_rows import (
+    CONVERSION_ERROR, MISSING_ID, RejectedRowsWriter
+)
+from app.utils.sample_data import SheetData, sanitize_row
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_ERROR_ROWS = 50
+
+
+class UploadValidator:
+    """Dry run of an upload: the same mapping, cleaning and matching as BulkInserter
+    done with column operations, reporting what would happen without writing."""
+
+    def __init__(self, db, supplier_id: int, sample_limit: int = SAMPLE_ERROR_ROWS,
+                 rejects: Optional[RejectedRowsWriter] = None):
+        self.db = db
+        self.supplier_id = supplier_id
+        self.sample_limit = sample_limit
+        self.rejects = rejects
+        # Cleaning and fingerprints come from the loader so predictions match a real run
+        self.inserter = BulkInserter(db, supplier_id)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.samples: List[Dict[str, Any]] = []
+
+    async def validate(self, sheets_data: List[SheetData], column_map: Dict[str, str], image_map: Dict[str, str]) -> Dict[str, Any]:
+        product_sheets, image_sheets = self.inserter._classify_sheets(sheets_data, column_map, image_map)
+        products, uploaded = await asyncio.to_thread(self._validate_products, product_sheets, column_map)
+        if uploaded:
+            uploaded = pd.concat(uploaded, ignore_index=True)
+            self._count_changes(products, uploaded, await self._stored_hashes(uploaded['product_id']))
+            # Like the real run, images can join to the products this upload writes
+            self.inserter.product_index.add(uploaded['product_id'])
+        images = await self._validate_images(image_sheets, image_map, column_map.get('product_id'))
+        return {
+            "dry_run": True,
+            "products": products,
+            "images": images,
+            "errors": {col: dict(codes) for col, codes in self.errors.items()},
+            "sample_errors": self.samples,
+        }
+
+    def _record(self, sheet: str, frame: pd.DataFrame, row_numbers: np.ndarray, mask: pd.Series,
+                column: str, code: str) -> None:
+        count = int(mask.sum())
+        if not count:
+            return
+        self.errors[column][code] += count
+        if self.rejects:
+            self.rejects.add(sheet, frame, mask, code, column, int(row_numbers[0]))
+        room = self.sample_limit - len(self.samples)
+        if room <= 0:
+            return
+        positions = np.flatnonzero(mask.to_numpy())[:room]
+        for position, row in zip(positions, frame.iloc[positions].to_dict(orient="records")):
+            self.samples.append({
+                "sheet": sheet,
+                "row": int(row_numbers[position]),
+                "column": column,
+                "error": code,
+                "values": sanitize_row({k: (v.item() if isinstance(v, np.generic) else v) for k, v in row.items()}),
+            })
+
+    async def _stored_hashes(self, product_ids: pd.Series) -> pd.Series:
+        """Stored content hash of the upload's products that already exist, by product ID"""
+        ids = product_ids.drop_duplicates().tolist()
+        stored: Dict[str, Optional[int]] = {}
+        for start in range(0, len(ids), RESOLVE_BATCH_SIZE):
+            result = await self.db.execute(
+                select(Product.product_id, Product.content_hash)
+                .where(Product.supplier_id == self.supplier_id, Product.product_id.in_(ids[start:start + RESOLVE_BATCH_SIZE]))
+            )
+            stored.update(result.all())
+        return pd.Series(stored, dtype=object)
+
+    @staticmethod
+    def _count_changes(counts: Dict[str, int], uploaded: pd.DataFrame, stored_hashes: pd.Series) -> None:
+        is_new = ~uploaded['product_id'].isin(stored_hashes.index)
+        unchanged = ~is_new & (uploaded['product_id'].map(stored_hashes) == uploaded[HASH_COLUMN])
+        counts["would_insert"] += int(is_new.sum())
+        counts["unchanged"] += int(unchanged.sum())
+        counts["would_update"] += int((~is_new & ~unchanged).sum())
+
+    def _validate_products(self, sheets: List[SheetData],
+                           column_map: Dict[str, str]) -> Tuple[Dict[str, int], List[pd.DataFrame]]:
+        """Clean the product sheets; returns the counts and the (product_id, content_hash) rows that would be written"""
+        reverse_map = {v: k for k, v in column_map.items() if v}
+        pid_col = column_map.get('product_id')
+        counts = {"rows": 0, "would_insert": 0, "would_update": 0, "unchanged": 0, "rejected": 0, "rows_with_conversion_errors": 0}
+        uploaded: List[pd.DataFrame] = []
+
+        for sheet_name, columns, frames in sheets:
+            seen_ids: Set[str] = set()
+            db_cols = self.inserter._product_db_columns(columns, reverse_map)
+            converters = compile_converters(Product.__table__, db_cols)
+            offset = 0
+            for frame in self.inserter._iter_frames(frames, [pid_col, *db_cols] if pid_col in columns else None):
+                # Spreadsheet row numbers: header is row 1
+                row_numbers = np.arange(offset, offset + len(frame)) + 2
+                offset += len(frame)
+                counts["rows"] += len(frame)
+                if pid_col not in frame.columns:
+                    self._record(sheet_name, frame, row_numbers, pd.Series(True, index=frame.index), "product_id", MISSING_ID)
+                    counts["rejected"] += len(frame)
+                    continue
+
+                cleaned, rejected = self.inserter._clean_product_frame(frame, pid_col, db_cols, converters, seen_ids)
+                bad_rows = pd.Series(False, index=frame.index)
+                for reason, column, mask in rejected:
+                    self._record(sheet_name, frame, row_numbers, mask, column, reason)
+                    if reason == CONVERSION_ERROR:
+                        bad_rows |= mask
+                    else:
+                        counts["rejected"] += int(mask.sum())
+                counts["rows_with_conversion_errors"] += int(bad_rows.sum())
+
+                cleaned = self.inserter._with_content_hash(cleaned)
+                uploaded.append(cleaned[['product_id', HASH_COLUMN]])
+
+        counts["sheets"] = len(sheets)
+        return counts, uploaded
+
+    async def _validate_images(self, sheets: List[SheetData], image_map: Dict[str, str],
+                               id_column: Optional[str]) -> Dict[str, int]:
+        """Match image rows the way the loader does, looking up only the product IDs they reference"""
+        sheet_to_db_map = {v: k for k, v in image_map.items() if v}
+        counts = {"sheets": len(sheets), "rows": 0, "matched": 0, "rejected": 0, "sheets_without_join_column": 0}
+
+        join_columns: List[Tuple[str, Dict[str, str], Any, str]] = []
+        for sheet_name, columns, frames in sheets:
+            available_mappings = {col: sheet_to_db_map[col] for col in columns if col in sheet_to_db_map}
+            if not available_mappings:
+                continue
+            join_col = await self.inserter._detect_join_column(frames, available_mappings, id_column, self.db)
+            if not join_col:
+                counts["sheets_without_join_column"] += 1
+                continue
+            join_columns.append((sheet_name, available_mappings, frames, join_col))
+
+        def parse():
+            for sheet_name, available_mappings, frames, join_col in join_columns:
+                offset = 0
+                for frame in self.inserter._iter_frames(frames, [join_col, *available_mappings]):
+                    yield sheet_name, available_mappings, frame, join_col, offset
+                    offset += len(frame)
+
+        async def prepare(item):
+            await self.inserter._resolve_product_ids(self.db, item[2][item[3]])
+
+        def match(item) -> List[Any]:
+            sheet_name, available_mappings, frame, join_col, offset = item
+            row_numbers = np.arange(offset, offset + len(frame)) + 2
+            counts["rows"] += len(frame)
+            # The loader's own rules, so empty-cell handling and superseded duplicates match a real run
+            images, rejected = self.inserter._clean_image_frame(frame, join_col, available_mappings)
+            for reason, column, mask in rejected:
+                self._record(sheet_name, frame, row_numbers, mask, column, reason)
+                counts["rejected"] += int(mask.sum())
+            counts["matched"] += len(images)
+            return []
+
+        async def write(_):
+            pass
+
+        await run_pipeline(parse(), match, write, prepare=prepare)
+        return counts
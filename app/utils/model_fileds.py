@@ -1,8 +1,11 @@
 from app.models.product_image import ProductImage
 
+# Columns the loader fills itself; never offered as mapping targets
+INTERNAL_FIELDS = {"supplier_id", "content_hash", "canonical_id", "search_vector"}
+
 
 def get_model_fields(model):
-    return [column.name for column in model.__table__.columns if column.name != "supplier_id"]
+    return [column.name for column in model.__table__.columns if column.name not in INTERNAL_FIELDS]
 
 
 def build_image_model_prompt():
@@ -1,107 +1,313 @@
 import asyncio
 import math
-from typing import Dict, List,Tuple
-import concurrent
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import pandas as pd
-from io import StringIO
-from tempfile import SpooledTemporaryFile
-from fastapi import UploadFile, HTTPException
+from fastapi import HTTPException
 import logging
-import os
+from app.core.process_pool import get_process_pool
 
 
 logger = logging.getLogger(__name__)
 
-MAX_CHUNK_SIZE = 1024 * 1024  # 1MB
-MAX_SPOOL_SIZE = 1024 * 1024 * 100  # 100MB
-INSPECTION_ROWS = 30000
-MAX_WORKERS = min(os.cpu_count() or 4, 8) 
+CSV_CHUNK_ROWS = 5000
+ARROW_BATCH_ROWS = 50000
+PREVIEW_SCAN_ROWS = 50
 
-async def extract_data(file: UploadFile):
-    """Extract data from uploaded files with improved performance"""
-    filename = file.filename.lower()
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc", ".arrows")
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+SUPPORTED_EXTENSIONS = (".csv", ".xls", ".xlsx", *PARQUET_EXTENSIONS, *ARROW_EXTENSIONS, *JSONL_EXTENSIONS)
+
+# (sheet name, column headers, frame source with iter_frames()/head())
+SheetData = Tuple[str, List[str], Any]
+
+
+class DataFrameSheet:
+    """Sheet that is already parsed into memory, exposed through the frame-source API.
+
+    Frames are row slices of CSV_CHUNK_ROWS, like the streaming readers yield,
+    so the pipeline bounds a parsed Excel sheet the same way it bounds a CSV.
+    """
+
+    def __init__(self, df: pd.DataFrame, chunk_rows: int = CSV_CHUNK_ROWS):
+        self.df = df
+        self.chunk_rows = chunk_rows
+        self.row_count = len(df)
+
+    def iter_frames(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        df = self.df if columns is None else self.df[[c for c in columns if c in self.df.columns]]
+        for start in range(0, len(df), self.chunk_rows):
+            yield df.iloc[start:start + self.chunk_rows]
+
+    def head(self, n: int) -> pd.DataFrame:
+        return self.df.head(n)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        return self.iter_frames()
+
+
+class CsvChunkReader:
+    """Re-iterable CSV source that streams DataFrame chunks from a staged upload.
+
+    Every pass re-reads the file from the start in CSV_CHUNK_ROWS chunks and
+    decodes incrementally, so only one chunk of rows is ever held in memory.
+    """
+
+    def __init__(self, path: str, chunk_rows: int = CSV_CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.row_count = None
+
+    def _reader(self, **kwargs):
+        return pd.read_csv(
+            self.path,
+            encoding="utf-8",
+            encoding_errors="ignore",
+            low_memory=True,
+            on_bad_lines='skip',  # Skip bad lines instead of failing
+            engine='c',  # Use C engine for better performance
+            **kwargs
+        )
+
+    def columns(self) -> List[str]:
+        return self._reader(nrows=0).columns.tolist()
+
+    def iter_frames(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Yield one DataFrame per CSV chunk, decoding only `columns` when given"""
+        count = 0
+        usecols = (lambda col: col in columns) if columns is not None else None
+        with self._reader(chunksize=self.chunk_rows, usecols=usecols) as reader:
+            for chunk in reader:
+                count += len(chunk)
+                yield chunk
+        self.row_count = count
+
+    def head(self, n: int) -> pd.DataFrame:
+        return self._reader(nrows=n)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        return self.iter_frames()
+
+
+def _import_pyarrow():
+    # pyarrow is only needed for the columnar formats; import it on first use
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Parquet and Arrow uploads require pyarrow on the server.")
+    return pyarrow
+
+
+class ParquetReader:
+    """Parquet source read through a memory map, one row group batch at a time.
+
+    Only the requested columns are decoded, so projecting to the mapped
+    columns skips every other column chunk in the file.
+    """
+
+    def __init__(self, path: str, batch_rows: int = ARROW_BATCH_ROWS):
+        pa = _import_pyarrow()
+        self.path = path
+        self.batch_rows = batch_rows
+        self._file = pa.parquet.ParquetFile(path, memory_map=True)
+        self.row_count = self._file.metadata.num_rows
+
+    def columns(self) -> List[str]:
+        return self._file.schema_arrow.names
+
+    def iter_frames(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        if columns is not None:
+            columns = [c for c in self.columns() if c in columns]
+        for batch in self._file.iter_batches(batch_size=self.batch_rows, columns=columns):
+            yield batch.to_pandas(split_blocks=True)
+
+    def head(self, n: int) -> pd.DataFrame:
+        batch = next(self._file.iter_batches(batch_size=n), None)
+        return batch.to_pandas() if batch is not None else pd.DataFrame(columns=self.columns())
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        return self.iter_frames()
+
+
+class ArrowIpcReader:
+    """Arrow IPC file or stream source over a memory map; batches are not copied until converted"""
+
+    def __init__(self, path: str):
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.row_count = None
+        with self._open() as reader:
+            self.schema = reader.schema
+
+    @contextmanager
+    def _open(self) -> Iterator[Any]:
+        # The reader does not own the memory map, so both are closed here
+        with self.pa.memory_map(self.path, "r") as source:
+            try:
+                reader = self.pa.ipc.open_file(source)
+            except self.pa.ArrowInvalid:
+                source.seek(0)
+                reader = self.pa.ipc.open_stream(source)
+            with reader:
+                yield reader
+
+    def _batches(self, reader) -> Iterator[Any]:
+        if isinstance(reader, self.pa.ipc.RecordBatchFileReader):
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+        else:
+            yield from reader
+
+    def columns(self) -> List[str]:
+        return self.schema.names
+
+    def iter_frames(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        if columns is not None:
+            columns = [c for c in self.columns() if c in columns]
+        count = 0
+        with self._open() as reader:
+            for batch in self._batches(reader):
+                count += batch.num_rows
+                yield (batch if columns is None else batch.select(columns)).to_pandas(split_blocks=True)
+        self.row_count = count
+
+    def head(self, n: int) -> pd.DataFrame:
+        with self._open() as reader:
+            for batch in self._batches(reader):
+                if batch.num_rows:
+                    return batch.slice(0, n).to_pandas()
+        return pd.DataFrame(columns=self.columns())
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        return self.iter_frames()
+
+
+class JsonlReader:
+    """Newline-delimited JSON streamed in chunks of CSV_CHUNK_ROWS records.
+
+    JSON has no column layout to skip over, so projection happens right after
+    each chunk is parsed; only the projected columns travel further.
+    """
+
+    def __init__(self, path: str, chunk_rows: int = CSV_CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.row_count = None
+
+    def _reader(self, chunk_rows: Optional[int] = None):
+        return pd.read_json(self.path, lines=True, chunksize=chunk_rows or self.chunk_rows, dtype=False,
+                            convert_dates=False, encoding="utf-8", encoding_errors="ignore")
+
+    def columns(self) -> List[str]:
+        return self.head(PREVIEW_SCAN_ROWS).columns.tolist()
+
+    def iter_frames(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        count = 0
+        with self._reader() as reader:
+            for chunk in reader:
+                count += len(chunk)
+                yield chunk if columns is None else chunk[[c for c in columns if c in chunk.columns]]
+        self.row_count = count
+
+    def head(self, n: int) -> pd.DataFrame:
+        with self._reader(chunk_rows=n) as reader:
+            return next(iter(reader), pd.DataFrame())
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        return self.iter_frames()
+
+
+def _excel_engine(filename: str) -> str:
+    return 'openpyxl' if filename.endswith('.xlsx') else 'xlrd'
+
+
+def _excel_sheet_names(path: str, engine: str) -> List[str]:
+    with pd.ExcelFile(path, engine=engine) as excel_file:
+        return excel_file.sheet_names
+
+
+def _parse_excel_sheet(path: str, sheet: str, engine: str) -> pd.DataFrame:
+    """Parse one sheet inside a pool worker; the DataFrame pickles back columnar"""
+    return pd.read_excel(
+        path,
+        sheet_name=sheet,
+        engine=engine,
+        na_filter=False  # Don't convert empty strings to NaN
+    )
+
+
+async def extract_data(path: str, filename: str):
+    """Extract sheets from a staged upload, parsing Excel sheets in the process pool"""
+    filename = filename.lower()
     logger.info(f"Processing file: {filename}")
     
     try:
         if filename.endswith(".csv"):
-            # Read CSV file with optimized settings
-            contents = await file.read()
-            text_stream = contents.decode("utf-8", errors="ignore")
-            
-            # Use more efficient CSV reading options
-            df = pd.read_csv(
-                StringIO(text_stream), 
-                nrows=INSPECTION_ROWS, 
-                low_memory=True,
-                on_bad_lines='skip',  # Skip bad lines instead of failing
-                engine='c'  # Use C engine for better performance
-            )
-            return [("CSV", df.columns.tolist(), df.to_dict(orient="records"))]
+            # Rows are streamed lazily in chunks instead of being loaded up front
+            reader = CsvChunkReader(path)
+            return [("CSV", reader.columns(), reader)]
+
+        elif filename.endswith(PARQUET_EXTENSIONS):
+            reader = ParquetReader(path)
+            return [("Parquet", reader.columns(), reader)]
+
+        elif filename.endswith(ARROW_EXTENSIONS):
+            reader = ArrowIpcReader(path)
+            return [("Arrow", reader.columns(), reader)]
+
+        elif filename.endswith(JSONL_EXTENSIONS):
+            reader = JsonlReader(path)
+            return [("JSONL", reader.columns(), reader)]
             
         elif filename.endswith((".xls", ".xlsx")):
-            # Efficiently read Excel file
-            tmp = SpooledTemporaryFile(max_size=MAX_SPOOL_SIZE)
-            # Read in larger chunks for better performance
-            while chunk := await file.read(MAX_CHUNK_SIZE):
-                tmp.write(chunk)
-            tmp.seek(0)
-            
-            excel_file = pd.ExcelFile(tmp)
+            loop = asyncio.get_running_loop()
+            pool = get_process_pool()
+            engine = _excel_engine(filename)
+            sheet_names = await loop.run_in_executor(pool, _excel_sheet_names, path, engine)
+
+            # One task per sheet so large workbooks parse on all cores
+            frames = await asyncio.gather(
+                *[loop.run_in_executor(pool, _parse_excel_sheet, path, sheet, engine) for sheet in sheet_names],
+                return_exceptions=True
+            )
+
             results = []
-            
-            # Process Excel sheets with optimized settings
-            for sheet in excel_file.sheet_names:
-                try:
-                    df = pd.read_excel(
-                        excel_file, 
-                        sheet_name=sheet, 
-                        nrows=INSPECTION_ROWS,
-                        engine='openpyxl' if filename.endswith('.xlsx') else 'xlrd',
-                        na_filter=False  # Don't convert empty strings to NaN
-                    )
-                    if not df.empty:
-                        results.append((sheet, df.columns.tolist(), df.to_dict(orient="records")))
-                    else:
-                        logger.warning(f"Sheet '{sheet}' is empty or unreadable.")
-                except Exception as sheet_err:
-                    logger.error(f"Error reading sheet '{sheet}': {sheet_err}")
+            for sheet, df in zip(sheet_names, frames):
+                if isinstance(df, Exception):
+                    logger.error(f"Error reading sheet '{sheet}': {df}")
+                elif not df.empty:
+                    results.append((sheet, df.columns.tolist(), DataFrameSheet(df)))
+                else:
+                    logger.warning(f"Sheet '{sheet}' is empty or unreadable.")
             
             return results
             
         else:
             raise HTTPException(status_code=400, detail="Unsupported file format.")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to extract data from {filename}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error extracting file content.")
 
-async def data_extraction(files: List[UploadFile]):
-    """Process multiple files concurrently with improved threading strategy"""
-    # Use a separate function that can be pickled for ProcessPoolExecutor
-    def _process_file(file):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(extract_data(file))
-        finally:
-            loop.close()
-    
+async def data_extraction(files: List[Dict[str, str]]):
+    """Extract all staged files concurrently; sheets are parsed in the process pool"""
+    extracted = await asyncio.gather(
+        *[extract_data(file["path"], file["filename"]) for file in files],
+        return_exceptions=True
+    )
+
     results = []
-    
-    # Use ThreadPoolExecutor for better I/O parallelism with uploaded files
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Submit all file processing tasks
-        future_to_file = {executor.submit(_process_file, file): file for file in files}
-        
-        # Collect results as they complete
-        for future in concurrent.futures.as_completed(future_to_file):
-            file = future_to_file[future]
-            try:
-                file_data = future.result()
-                results.extend(file_data)
-                logger.info(f"Successfully processed {file.filename}")
-            except Exception as exc:
-                logger.error(f"File {file.filename} generated an exception: {exc}")
+    for file, file_data in zip(files, extracted):
+        if isinstance(file_data, Exception):
+            logger.error(f"File {file['filename']} generated an exception: {file_data}")
+            continue
+        results.extend(file_data)
+        logger.info(f"Successfully processed {file['filename']}")
     
     return results
 
@@ -118,32 +324,6 @@ def sanitize_row(row: Dict) -> Dict:
             sanitized[k] = v
     return sanitized
 
-def generate_preview(sheets_data: List[Tuple[str, List[str], List[Dict]]]) -> List[Dict]:
-    """Generate preview of sheet data with improved sanitization"""
-    preview = []
-    for sheet_name, columns, rows in sheets_data:
-        # Only include non-empty samples
-        sample_rows = []
-        sample_count = 0
-        
-        for row in rows:
-            if sample_count >= 3:
-                break
-                
-            sanitized_row = sanitize_row(row)
-            # Check if row has actual data (not all nulls)
-            if any(v is not None for v in sanitized_row.values()):
-                sample_rows.append(sanitized_row)
-                sample_count += 1
-        
-        preview.append({
-            "sheet_name": sheet_name,
-            "columns": columns,
-            "sample": sample_rows
-        })
-    
-    return preview
-
 # MAX_CHUNK_SIZE = 1024 * 1024  
 # MAX_SPOOL_SIZE = 1024 * 1024 * 100 
 # INSPECTION_ROWS = 1000
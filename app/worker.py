@@ -0,0 +1,120 @@
+"""Ingestion worker: claims queued upload jobs from Postgres and processes them.
+
+Run one or more of these next to the API, on any node that can reach the
+database and the upload staging directory:
+
+    python -m app.worker --concurrency 2 --metrics-port 9101
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from dotenv import load_dotenv
+from prometheus_client import start_http_server
+
+load_dotenv()
+
+from app.core.database import AsyncSessionLocal, engine
+from app.core.metrics import JOBS, file_format
+from app.core.process_pool import init_process_pool, shutdown_process_pool
+import app.models  # noqa: F401  register all tables on Base.metadata
+from app.models.ingestion_job import IngestionJob
+from app.services.jobs.ingestion_queue import (
+    claim_next_job, complete_job, heartbeat_job, record_upload, remove_staged_files, retry_or_fail_job,
+    save_job_checkpoint, update_job_progress, update_job_queue_position
+)
+from app.services.product.ingestion import run_ingestion
+from app.services.product.rejected_rows import rejected_rows_path
+
+logger = logging.getLogger("app.worker")
+
+POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", "2"))
+HEARTBEAT_INTERVAL = float(os.getenv("INGESTION_HEARTBEAT_INTERVAL", "30"))
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+
+async def _heartbeat(job_id: int):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            await heartbeat_job(job_id)
+        except Exception as e:
+            logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+
+
+async def process_job(job: IngestionJob) -> None:
+    async def on_progress(stage: str, progress: int, rows_processed=None):
+        await update_job_progress(job.id, stage, progress, rows_processed)
+
+    async def on_queue(position: int):
+        await update_job_queue_position(job.id, position)
+
+    async def on_checkpoint(db, checkpoint):
+        await save_job_checkpoint(db, job.id, checkpoint)
+
+    heartbeat = asyncio.create_task(_heartbeat(job.id))
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await run_ingestion(db, job.supplier_id, job.files, on_progress=on_progress,
+                                         dry_run=job.dry_run, rejects_path=rejected_rows_path(job.id),
+                                         on_queue=on_queue, checkpoint=job.checkpoint, on_checkpoint=on_checkpoint)
+        await complete_job(job.id, result)
+        JOBS.labels("done", file_format(file["filename"] for file in job.files)).inc()
+        if not job.dry_run:
+            await record_upload(job, "success", "Upload processed", result)
+        logger.info(f"Ingestion job {job.id} finished")
+    except Exception as e:
+        logger.error(f"Ingestion job {job.id} failed: {e}", exc_info=True)
+        error = str(getattr(e, "detail", e))
+        if await retry_or_fail_job(job.id, error):
+            # Batch-mode uploads keep their staged files and resume from the last checkpoint
+            JOBS.labels("retried", file_format(file["filename"] for file in job.files)).inc()
+            return
+        JOBS.labels("failed", file_format(file["filename"] for file in job.files)).inc()
+        if not job.dry_run:
+            await record_upload(job, "error", error)
+    finally:
+        heartbeat.cancel()
+    remove_staged_files(job.files)
+
+
+async def run_worker(worker_id: str, poll_interval: float = POLL_INTERVAL) -> None:
+    logger.info(f"Ingestion worker {worker_id} started")
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await claim_next_job(db, worker_id)
+        except Exception as e:
+            logger.error(f"Worker {worker_id} could not claim a job: {e}")
+            job = None
+        if job is None:
+            await asyncio.sleep(poll_interval)
+            continue
+        await process_job(job)
+
+
+async def main(concurrency: int, poll_interval: float) -> None:
+    base_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    init_process_pool()
+    try:
+        await asyncio.gather(*[
+            run_worker(f"{base_id}-{slot}", poll_interval) for slot in range(concurrency)
+        ])
+    finally:
+        shutdown_process_pool()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued product upload jobs")
+    parser.add_argument("--concurrency", type=int, default=1, help="jobs processed in parallel by this process")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL, help="seconds to wait when the queue is empty")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="serve Prometheus metrics on this port (0 = off)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)-8s | %(name)s:%(lineno)d | %(message)s")
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+        logger.info(f"Serving metrics on port {args.metrics_port}")
+    asyncio.run(main(args.concurrency, args.poll_interval))
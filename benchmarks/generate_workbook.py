@@ -0,0 +1,204 @@
+"""Generate a synthetic supplier upload for the ingestion benchmarks.
+
+The output looks like what suppliers actually send: product rows with dirty
+numerics (currency signs, units, 'N/A', decimal commas), duplicate and blank
+IDs, Excel serial dates, and separate image rows keyed by the product ID in a
+different spelling (case, spaces, leading zeros, '123.0'). Generation is
+seeded, so the same arguments always produce the same rows.
+
+    python -m benchmarks.generate_workbook --rows 100000 --format xlsx --out bench_data
+
+Writes the data files plus <name>.mapping.json with the column and image
+mappings the benchmark harness uses instead of the LLM.
+"""
+import argparse
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 100_000
+XLSX_SHEET_ROWS = 1_000_000  # Excel stops at 1,048,576 rows per sheet
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+BRANDS = ["Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay", "Soylent", "Tyrell"]
+CATEGORIES = ["Fasteners", "Adhesives", "Safety", "Electrical", "Plumbing", "Tools", "Lighting", "Cleaning"]
+NOUNS = ["Bolt", "Glove", "Cable", "Valve", "Drill", "Lamp", "Tape", "Mask", "Hose", "Switch"]
+ADJECTIVES = ["Heavy Duty", "Compact", "Industrial", "Premium", "Economy", "Stainless", "Insulated"]
+
+PRODUCT_COLUMNS = {
+    "product_id": "Item Code",
+    "product_name": "Product Title",
+    "brand": "Brand",
+    "category": "Category",
+    "price": "Unit Price",
+    "stock_qty": "Qty On Hand",
+    "item_weight": "Weight (kg)",
+    "description": "Description",
+    "is_active": "Active",
+}
+RESTOCK_COLUMN = "Last Restock"
+IMAGE_COLUMNS = {
+    "main_image": "Main Image",
+    "image_variant1": "Image 2",
+    "image_variant2": "Image 3",
+    "msds_image_url": "MSDS URL",
+}
+IMAGE_KEY_COLUMN = "Ref"
+
+
+def _product_ids(numbers: np.ndarray) -> np.ndarray:
+    """Stored IDs: a mix of prefixed, zero-padded and purely numeric codes"""
+    style = numbers % 3
+    return np.where(
+        style == 0, np.char.add("SKU-", np.char.zfill(numbers.astype(str), 7)),
+        np.where(style == 1, np.char.add("AB", np.char.zfill(numbers.astype(str), 6)), (numbers + 10_000).astype(str)),
+    )
+
+
+def _respell(ids: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """The same IDs as an image sheet might spell them"""
+    variant = rng.integers(0, 5, len(ids))
+    numeric = np.char.isdigit(ids)
+    spelled = ids.copy()
+    spelled = np.where(variant == 1, np.char.lower(spelled), spelled)
+    spelled = np.where(variant == 2, np.char.replace(spelled, "-", " - "), spelled)
+    spelled = np.where((variant == 3) & numeric, np.char.add("00", spelled), spelled)
+    spelled = np.where((variant == 4) & numeric, np.char.add(spelled, ".0"), spelled)
+    return np.where((variant == 4) & ~numeric, np.char.add(spelled, " "), spelled)
+
+
+def _dirty_numbers(values: np.ndarray, rng: np.random.Generator, unit: str = "") -> np.ndarray:
+    text = np.char.mod("%.2f", values).astype(object)
+    dirt = rng.random(len(values))
+    text[dirt < 0.03] = "N/A"
+    text[(dirt >= 0.03) & (dirt < 0.05)] = ""
+    currency = (dirt >= 0.05) & (dirt < 0.07)
+    text[currency] = ["$" + value if not unit else value + unit for value in text[currency]]
+    comma = (dirt >= 0.07) & (dirt < 0.08)
+    text[comma] = [value.replace(".", ",") for value in text[comma]]
+    return text
+
+
+def product_chunks(rows: int, seed: int, for_excel: bool) -> Iterator[pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, rows - start)
+        numbers = np.arange(start, start + size)
+        ids = _product_ids(numbers).astype(object)
+        # About 0.5% repeat an earlier ID and 0.3% have none
+        roll = rng.random(size)
+        duplicate = roll < 0.005
+        ids[duplicate] = ids[rng.integers(0, size, duplicate.sum())]
+        ids[(roll >= 0.005) & (roll < 0.008)] = None
+
+        brands = rng.choice(BRANDS, size)
+        names = [f"{b} {a} {n} {i}" for b, a, n, i in zip(brands, rng.choice(ADJECTIVES, size), rng.choice(NOUNS, size), numbers)]
+        quantities = rng.integers(0, 5000, size).astype(str).astype(object)
+        quantities[rng.random(size) < 0.02] = "-"
+        fractional = rng.random(size) < 0.05
+        quantities[fractional] = [q + ".0" for q in quantities[fractional]]
+
+        serials = rng.integers(43000, 46000, size)
+        if for_excel:
+            restock = [EXCEL_EPOCH + timedelta(days=int(s)) if s % 2 else int(s) for s in serials]
+        else:
+            restock = [(EXCEL_EPOCH + timedelta(days=int(s))).strftime("%d/%m/%Y") if s % 2 else str(s) for s in serials]
+
+        yield pd.DataFrame({
+            PRODUCT_COLUMNS["product_id"]: ids,
+            PRODUCT_COLUMNS["product_name"]: names,
+            PRODUCT_COLUMNS["brand"]: brands,
+            PRODUCT_COLUMNS["category"]: rng.choice(CATEGORIES, size),
+            PRODUCT_COLUMNS["price"]: _dirty_numbers(rng.gamma(2.0, 25.0, size), rng),
+            PRODUCT_COLUMNS["stock_qty"]: quantities,
+            PRODUCT_COLUMNS["item_weight"]: _dirty_numbers(rng.gamma(1.5, 2.0, size), rng, unit="kg"),
+            PRODUCT_COLUMNS["description"]: [f"{n}. Suitable for trade and DIY use; pack of {q}." for n, q in
+                                            zip(names, rng.integers(1, 50, size))],
+            PRODUCT_COLUMNS["is_active"]: rng.choice(["Yes", "No", "1", "0", "TRUE", ""], size, p=[.5, .1, .2, .05, .1, .05]),
+            RESTOCK_COLUMN: restock,
+        })
+
+
+def image_chunks(rows: int, seed: int) -> Iterator[pd.DataFrame]:
+    """Image rows for about 80% of the products, in shuffled chunk order"""
+    rng = np.random.default_rng(seed + 1)
+    for start in range(0, rows, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, rows - start)
+        numbers = np.arange(start, start + size)
+        numbers = numbers[rng.random(size) < 0.8]
+        rng.shuffle(numbers)
+        base = np.char.add("https://cdn.example.com/img/", numbers.astype(str))
+        msds = np.where(numbers % 7 == 0, np.char.add(np.char.add("https://cdn.example.com/msds/", numbers.astype(str)), ".pdf"), "")
+        yield pd.DataFrame({
+            IMAGE_KEY_COLUMN: _respell(_product_ids(numbers), rng),
+            IMAGE_COLUMNS["main_image"]: np.char.add(base, "_1.jpg"),
+            IMAGE_COLUMNS["image_variant1"]: np.char.add(base, "_2.jpg"),
+            IMAGE_COLUMNS["image_variant2"]: np.where(numbers % 3 == 0, np.char.add(base, "_3.jpg"), ""),
+            IMAGE_COLUMNS["msds_image_url"]: msds,
+        })
+
+
+def _write_csv(path: Path, chunks: Iterator[pd.DataFrame]) -> None:
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+
+
+def _write_xlsx_sheets(workbook, title: str, chunks: Iterator[pd.DataFrame]) -> None:
+    sheet, written, part = None, 0, 0
+    for chunk in chunks:
+        for row in chunk.itertuples(index=False):
+            if sheet is None or written >= XLSX_SHEET_ROWS:
+                part += 1
+                sheet = workbook.create_sheet(title if part == 1 else f"{title} {part}")
+                sheet.append(list(chunk.columns))
+                written = 0
+            sheet.append([None if value is None or value == "" else value for value in row])
+            written += 1
+
+
+def generate(rows: int, fmt: str, out: Path, seed: int = 42, name: str = None) -> List[Path]:
+    """Write one upload and its mapping sidecar; returns the data files"""
+    out.mkdir(parents=True, exist_ok=True)
+    name = name or f"supplier_{rows}_{fmt}_s{seed}"
+    if fmt == "csv":
+        files = [out / f"{name}_products.csv", out / f"{name}_images.csv"]
+        _write_csv(files[0], product_chunks(rows, seed, for_excel=False))
+        _write_csv(files[1], image_chunks(rows, seed))
+    elif fmt == "xlsx":
+        from openpyxl import Workbook
+        files = [out / f"{name}.xlsx"]
+        # write_only streams rows to disk instead of building the sheet in memory
+        workbook = Workbook(write_only=True)
+        _write_xlsx_sheets(workbook, "Products", product_chunks(rows, seed, for_excel=True))
+        _write_xlsx_sheets(workbook, "Images", image_chunks(rows, seed))
+        workbook.save(files[0])
+    else:
+        raise ValueError(f"Unknown format '{fmt}', expected csv or xlsx")
+
+    mapping = {
+        "dataset": {"rows": rows, "format": fmt, "seed": seed},
+        "column_mapping": PRODUCT_COLUMNS,
+        "image_mapping": IMAGE_COLUMNS,
+        "files": [f.name for f in files],
+    }
+    (out / f"{name}.mapping.json").write_text(json.dumps(mapping, indent=2))
+    return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic supplier upload")
+    parser.add_argument("--rows", type=int, default=10_000, help="product rows (10k to 5M)")
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=Path, default=Path("bench_data"))
+    parser.add_argument("--name", help="file name stem (default derived from rows, format and seed)")
+    args = parser.parse_args()
+    for path in generate(args.rows, args.format, args.out, args.seed, args.name):
+        print(f"{path} ({path.stat().st_size / 1024 ** 2:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Benchmark the full ingestion pipeline against a local Postgres.
+
+Runs run_ingestion (parse, map, clean, product and image writes) on a
+generated upload with the LLM mappers replaced by the generator's known
+mapping, then appends one JSON line per run to the results file: rows per
+second, peak RSS of the process and its parse workers, per-stage timings from
+the ingestion metrics, the pipeline debug stats, and the git commit, so runs of
+the same dataset and settings can be compared from one commit to the next.
+
+    python -m benchmarks.run_ingestion --rows 100000 --format xlsx --load-mode copy --compare
+
+Uses DATABASE_URL; the benchmark supplier's products are deleted before each
+run unless --keep-catalog is given (which measures a re-upload instead).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+BENCH_EMAIL = "bench-supplier@example.com"
+DEFAULT_RESULTS = Path(__file__).parent / "results.jsonl"
+STAGE_METRICS = ("ingestion_stage_duration_seconds_sum", "ingestion_stage_rows_total", "ingestion_stage_bytes_total")
+COMPARE_FIELDS = ("seconds", "rows_per_second", "peak_rss_mb", "peak_worker_rss_mb")
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fingerprint(paths: List[Path]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _worker_peak_rss_mb(pool) -> Optional[float]:
+    """Largest peak RSS among the live parse workers.
+
+    Read from /proc rather than RUSAGE_CHILDREN, which also counts the memory a
+    spawned child inherited from this process before exec.
+    """
+    peaks = []
+    for pid in list(getattr(pool, "_processes", None) or {}):
+        try:
+            status = Path(f"/proc/{pid}/status").read_text()
+        except OSError:
+            continue
+        peaks += [int(line.split()[1]) for line in status.splitlines() if line.startswith("VmHWM:")]
+    return round(max(peaks) / 1024, 1) if peaks else None
+
+
+def _stage_totals() -> Dict[str, Dict[str, float]]:
+    """Stage durations, rows and bytes accumulated in this process, summed over formats"""
+    from prometheus_client import REGISTRY
+    totals: Dict[str, Dict[str, float]] = {}
+    for metric in REGISTRY.collect():
+        for sample in metric.samples:
+            if sample.name in STAGE_METRICS:
+                field = sample.name.split("_")[2]  # duration, rows or bytes
+                stage = totals.setdefault(sample.labels["stage"], {})
+                stage[field] = round(stage.get(field, 0) + sample.value, 4)
+    return totals
+
+
+def load_dataset(args) -> Dict[str, Any]:
+    """Generate the upload unless it already exists; returns its mapping sidecar plus paths"""
+    from benchmarks.generate_workbook import generate
+    name = f"supplier_{args.rows}_{args.format}_s{args.seed}"
+    sidecar = args.data_dir / f"{name}.mapping.json"
+    if not sidecar.exists():
+        print(f"Generating {args.rows} rows of {args.format} in {args.data_dir}")
+        generate(args.rows, args.format, args.data_dir, args.seed, name)
+    dataset = json.loads(sidecar.read_text())
+    dataset["paths"] = [args.data_dir / filename for filename in dataset["files"]]
+    return dataset
+
+
+async def _bench_supplier(reset: bool) -> int:
+    from sqlalchemy import delete, select
+    from app.core.database import AsyncSessionLocal, init_db
+    from app.models.product import Product
+    from app.models.product_image import ProductImage
+    from app.models.user import User, UserRole
+
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        supplier_id = (await db.execute(select(User.id).where(User.email == BENCH_EMAIL))).scalar()
+        if supplier_id is None:
+            user = User(email=BENCH_EMAIL, username="bench-supplier", role=UserRole.supplier)
+            db.add(user)
+            await db.flush()
+            supplier_id = user.id
+        if reset:
+            product_ids = select(Product.product_id).where(Product.supplier_id == supplier_id)
+            await db.execute(delete(ProductImage).where(ProductImage.product_id.in_(product_ids)))
+            await db.execute(delete(Product).where(Product.supplier_id == supplier_id))
+        await db.commit()
+    return supplier_id
+
+
+def _stub_mapping(mode: str, dataset: Dict[str, Any]) -> None:
+    """Keep the LLM out of the measurement"""
+    from app.services.product import ingestion
+
+    async def no_llm(*args, **kwargs):
+        raise RuntimeError("LLM disabled for benchmarks")
+
+    ingestion.generate_column_mapping = no_llm
+    ingestion.generate_image_mapping = no_llm
+    if mode == "fixed":
+        async def fixed_mapping(kind, sheets_data, generate, signature=None, profiles=None):
+            return dict(dataset["column_mapping" if kind == "column" else "image_mapping"])
+        ingestion.resolve_mapping = fixed_mapping
+
+
+async def run_once(args, dataset: Dict[str, Any]) -> Dict[str, Any]:
+    from app.core.database import AsyncSessionLocal, engine
+    from app.services.product.ingestion import run_ingestion
+
+    supplier_id = await _bench_supplier(reset=not args.keep_catalog)
+    files = [{"path": str(path), "filename": path.name} for path in dataset["paths"]]
+    # Rejected rows are reported the way the worker does it, so that cost is measured too
+    rejects_path = args.data_dir / "rejected" / f"{dataset['paths'][0].stem}.csv"
+    try:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            outcome = await run_ingestion(db, supplier_id, files, rejects_path=rejects_path)
+            seconds = time.perf_counter() - started
+    finally:
+        await engine.dispose()
+    return {"seconds": round(seconds, 3), "outcome": outcome}
+
+
+def measure(args) -> Dict[str, Any]:
+    dataset = load_dataset(args)
+    fingerprint = _fingerprint(dataset["paths"])
+
+    from app.core.process_pool import get_process_pool, init_process_pool, shutdown_process_pool
+    import app.models  # noqa: F401  register all tables on Base.metadata
+    _stub_mapping(args.mapping, dataset)
+
+    init_process_pool()
+    try:
+        run = asyncio.run(run_once(args, dataset))
+        worker_rss = _worker_peak_rss_mb(get_process_pool())
+    finally:
+        shutdown_process_pool()
+
+    result = run["outcome"]["result"]
+    rows = dataset["dataset"]["rows"]
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "dataset": {**dataset["dataset"], "fingerprint": fingerprint,
+                    "bytes": sum(path.stat().st_size for path in dataset["paths"])},
+        "config": {
+            "load_mode": os.environ["BULK_LOAD_MODE"],
+            "writers": int(os.environ["BULK_PARALLEL_WRITERS"]),
+            "transaction_mode": os.environ["BULK_TRANSACTION_MODE"],
+            "parse_workers": int(os.environ["PARSE_POOL_WORKERS"]),
+            "mapping": args.mapping,
+            "keep_catalog": args.keep_catalog,
+        },
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        "seconds": run["seconds"],
+        "rows_per_second": round(rows / run["seconds"], 1),
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_worker_rss_mb": worker_rss,
+        "stages": _stage_totals(),
+        "products": result.get("products"),
+        "images": result.get("images"),
+        "rejected_rows": result.get("rejected_rows"),
+        "debug_stats": result.get("debug_stats"),
+    }
+
+
+def _same_setup(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return a["dataset"]["fingerprint"] == b["dataset"]["fingerprint"] and a["config"] == b["config"]
+
+
+def compare(record: Dict[str, Any], results: Path) -> None:
+    """Print the change against the last recorded run with the same dataset and settings"""
+    previous = None
+    if results.exists():
+        for line in results.read_text().splitlines():
+            earlier = json.loads(line)
+            if _same_setup(earlier, record):
+                previous = earlier
+    if previous is None:
+        print("No earlier run with this dataset and configuration to compare against")
+        return
+    print(f"Compared with {previous['commit']} ({previous['timestamp']}):")
+    for field in COMPARE_FIELDS:
+        before, after = previous[field], record[field]
+        change = f"{(after - before) / before:+.1%}" if before and after is not None else "n/a"
+        print(f"  {field:<20} {before!s:>12} -> {after!s:>12} ({change})")
+    for stage, totals in record["stages"].items():
+        before = previous["stages"].get(stage, {}).get("duration")
+        if before:
+            print(f"  {stage + ' seconds':<20} {before:>12} -> {totals['duration']:>12} "
+                  f"({(totals['duration'] - before) / before:+.1%})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark product ingestion on a generated upload")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", type=Path, default=Path("bench_data"))
+    parser.add_argument("--load-mode", choices=["insert", "copy"], default=os.getenv("BULK_LOAD_MODE", "insert"))
+    parser.add_argument("--writers", type=int, default=int(os.getenv("BULK_PARALLEL_WRITERS", "1")))
+    parser.add_argument("--transaction-mode", choices=["upload", "savepoint", "batch"],
+                        default=os.getenv("BULK_TRANSACTION_MODE", "upload"))
+    parser.add_argument("--parse-workers", type=int, default=int(os.getenv("PARSE_POOL_WORKERS", min(os.cpu_count() or 4, 8))))
+    parser.add_argument("--mapping", choices=["fixed", "heuristic"], default="fixed",
+                        help="fixed: the generator's mapping; heuristic: the local mapper (LLM disabled)")
+    parser.add_argument("--keep-catalog", action="store_true", help="load on top of the previous run's products")
+    parser.add_argument("--results", type=Path, default=DEFAULT_RESULTS)
+    parser.add_argument("--compare", action="store_true", help="show the change against the previous comparable run")
+    args = parser.parse_args()
+
+    # Settings read at import time must be in place before the app modules load
+    os.environ["BULK_LOAD_MODE"] = args.load_mode
+    os.environ["BULK_PARALLEL_WRITERS"] = str(args.writers)
+    os.environ["BULK_TRANSACTION_MODE"] = args.transaction_mode
+    os.environ["PARSE_POOL_WORKERS"] = str(args.parse_workers)
+    load_dotenv()
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    record = measure(args)
+    print(json.dumps({key: record[key] for key in ("commit", "dataset", "config", "seconds", "rows_per_second",
+                                                  "peak_rss_mb", "peak_worker_rss_mb", "stages")}, indent=2))
+    if args.compare:
+        compare(record, args.results)
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.results, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+if __name__ == "__main__":
+    main()